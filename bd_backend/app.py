@@ -5,13 +5,39 @@ from flask_jwt_extended import JWTManager, create_access_token, jwt_required, ge
 from dotenv import load_dotenv
 import os
 from models import db, Dish, OrderOfDishes, Country, Season, Chief, DishType, Human, DishRating, Product, Recipe
-from services.dish_service import calculate_dish_cost, get_seasonal_dishes, change_dish_chef
-from services.rating_service import update_dish_rating, get_dish_ratings
-from services.order_service import create_order
+from services.dish_service import calculate_dish_cost, get_seasonal_dishes, change_dish_chef, reassign_chef_dishes
+from services.rating_service import update_dish_rating, get_dish_ratings, dish_ratings_query, DISH_RATINGS_FIELDS
+from services.order_service import create_order, order_batcher
+from services.delete_service import delete_with_policies
+from services.batch_service import batch_delete, batch_update, BATCH_ENTITIES
+from services.nutrition_service import (
+    nutrition_engine, get_dish_nutrition, get_makeable_dishes, NUTRITION_FIELDS, ENGINE_TABLES
+)
+from services.job_service import report_jobs, JobQueueFull
+from services.simulation_service import simulate_pricing
+from services.similarity_service import similarity_index, get_similar_dishes, SIMILAR_FIELDS
+from services.menu_service import optimize_menu, MENU_SEARCH_SECONDS, MENU_SEARCH_MAX_SECONDS
+from services.recommendation_service import (
+    recommendation_job, get_recommendations, RECOMMENDATION_FIELDS, RECOMMENDATIONS_MAX_N
+)
+from services.report_service import (
+    get_top_dishes, get_season_consistency, TOP_METRICS, TOP_WINDOWS, TOP_DISHES_FIELDS, SEASON_CONSISTENCY_FIELDS
+)
+from services.archive_service import select_partitioned, ARCHIVE_TABLES
+from services.backup_service import backup_database, backup_dir, list_backups
+from services.cache_service import register_cache_invalidation, cache_stats
+from services.change_service import get_changes, compact_changes, CHANGE_FEEDS, CHANGES_LIMIT
+from services.schema_service import ensure_schema
+from http_compression import register_compression, cached_payload
+from serializers import (
+    json_response, rows_response, csv_response, stream_rows, QueryParamError,
+    country_serializer, season_serializer, chief_serializer, dish_type_serializer, dish_serializer,
+    user_serializer, rating_serializer, product_serializer, recipe_serializer, order_serializer
+)
 from flasgger import Swagger
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import date, datetime
 
 load_dotenv()
 
@@ -29,12 +55,36 @@ Swagger(app, template={
 })
 
 # Конфигурация БД
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///test.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['JWT_SECRET_KEY'] = os.getenv('SECRET_KEY', 'super-secret-key')
+# Сжатие ответов: меньше порога (в байтах) отдаём как есть
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_LEVEL'] = int(os.getenv('COMPRESS_LEVEL', 6))
+# Приём заказов с групповым коммитом: ORDER_BATCHING=1 включает очередь, пачка — до N заказов или M мс
+app.config['ORDER_BATCHING'] = os.getenv('ORDER_BATCHING', '0') == '1'
+app.config['ORDER_BATCH_SIZE'] = int(os.getenv('ORDER_BATCH_SIZE', 200))
+app.config['ORDER_BATCH_MS'] = int(os.getenv('ORDER_BATCH_MS', 5))
+# Каталог снимков БД; по умолчанию instance/backups
+app.config['BACKUP_DIR'] = os.getenv('BACKUP_DIR')
+# Сколько дней хранится журнал изменений для /api/changes
+app.config['CHANGE_LOG_RETENTION_DAYS'] = int(os.getenv('CHANGE_LOG_RETENTION_DAYS', 7))
 jwt = JWTManager(app)
 
 db.init_app(app)
+register_cache_invalidation(db)
+register_compression(app)
+
+with app.app_context():
+    ensure_schema()
+
+@app.before_request
+def start_background_jobs():
+    recommendation_job.start(app)
+
+@app.errorhandler(QueryParamError)
+def handle_query_param_error(e):
+    return jsonify({'message': str(e)}), 400
 
 def admin_required(fn):
     @wraps(fn)
@@ -48,10 +98,24 @@ def admin_required(fn):
 
 # Регистрация API
 @app.route('/api/dishes', methods=['GET'])
+@cached_payload('dish')
 def get_dishes():
     """
     Получить список всех блюд
     ---
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_dish,name_dish')
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список блюд
@@ -65,15 +129,7 @@ def get_dishes():
               name_dish:
                 type: string
     """
-    dishes = Dish.query.all()
-    return jsonify([{
-        'id_dish': d.id_dish,
-        'name_dish': d.name_dish,
-        'id_season': d.id_season,
-        'id_country': d.id_country,
-        'id_group': d.id_group,
-        'id_chief': d.id_chief
-    } for d in dishes])
+    return dish_serializer.for_request().respond()
 
 @app.route('/api/dishes/<int:id>', methods=['GET'])
 def get_dish(id):
@@ -81,6 +137,11 @@ def get_dish(id):
     Получить информацию о конкретном блюде по id
     ---
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_dish,name_dish')
       - name: id
         in: path
         type: integer
@@ -112,16 +173,9 @@ def get_dish(id):
             error:
               type: string
     """
-    dish = Dish.query.get(id)
+    dish = dish_serializer.for_request().fetch_by_pk(id)
     if dish:
-        return jsonify({
-            'id_dish': dish.id_dish,
-            'name_dish': dish.name_dish,
-            'id_season': dish.id_season,
-            'id_country': dish.id_country,
-            'id_group': dish.id_group,
-            'id_chief': dish.id_chief
-        })
+        return json_response(dish)
     return jsonify({'error': 'Dish not found'}), 404
 
 @app.route('/api/dishes', methods=['POST'])
@@ -248,6 +302,159 @@ def update_dish(id):
     db.session.commit()
     return jsonify({'message': 'Блюдо обновлено'})
 
+def dry_run_arg(value):
+    return value.lower() in ('1', 'true', 'yes')
+
+def delete_response(model, ident, deleted_message, not_found_message):
+    # Зависимые строки обрабатываются по политикам из delete_service (restrict / cascade / nullify)
+    dry_run = request.args.get('dry_run', False, type=dry_run_arg)
+    result = delete_with_policies(model, ident, dry_run)
+    if result.get('not_found'):
+        return jsonify({'message': not_found_message}), 404
+    if not result['success']:
+        # 409 — только запрет политики restrict; прочие ошибки БД (блокировки и т. п.) — 500
+        return jsonify(result), 409 if result.get('restricted') else 500
+    if dry_run:
+        return jsonify({'dry_run': True, 'affected': result['affected']}), 200
+    return jsonify({'message': deleted_message, 'affected': result['affected']}), 200
+
+@app.route('/api/<entity>/batch_delete', methods=['POST'])
+@admin_required
+def batch_delete_endpoint(entity):
+    """
+    Массовое удаление записей одной транзакцией (только для администратора)
+    ---
+    tags:
+      - Массовые операции
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+      - name: entity
+        in: path
+        type: string
+        required: true
+        enum: [orders, ratings, users, dishes, products, countries]
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+              example: [1, 2, 3]
+            filter:
+              type: object
+              description: >
+                Вместо ids: {"поле": значение} или {"поле": {"gte": ..., "lt": ..., "in": [...], "is_null": true}}
+              example: {"date": {"lt": "2024-01-01"}}
+            dry_run:
+              type: boolean
+              default: false
+              description: Только посчитать затронутые строки
+    responses:
+      200:
+        description: >
+          matched — найдено записей, deleted — удалено, affected — зависимые строки по политикам удаления
+        schema:
+          type: object
+      400:
+        description: Некорректный список id или фильтр
+        schema:
+          type: object
+      404:
+        description: Неизвестная сущность
+        schema:
+          type: object
+      409:
+        description: Удаление запрещено политикой restrict
+        schema:
+          type: object
+      500:
+        description: Ошибка базы данных, удаление не выполнено
+    """
+    if entity not in BATCH_ENTITIES:
+        return jsonify({'message': 'Неизвестная сущность'}), 404
+    data = request.json or {}
+    result = batch_delete(entity, data.get('ids'), data.get('filter'), bool(data.get('dry_run')))
+    if result['success']:
+        return jsonify(result), 200
+    if result.get('invalid'):
+        return jsonify(result), 400
+    return jsonify(result), 409 if result.get('restricted') else 500
+
+@app.route('/api/<entity>/batch', methods=['PATCH'])
+@admin_required
+def batch_update_endpoint(entity):
+    """
+    Массовое изменение полей записей одной транзакцией (только для администратора)
+    ---
+    tags:
+      - Массовые операции
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+      - name: entity
+        in: path
+        type: string
+        required: true
+        enum: [orders, ratings, users, dishes, products, countries]
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - values
+          properties:
+            ids:
+              type: array
+              items:
+                type: integer
+            filter:
+              type: object
+              description: Вместо ids — фильтр, как в batch_delete
+              example: {"id_chief": 3}
+            values:
+              type: object
+              description: Новые значения полей (первичный ключ менять нельзя)
+              example: {"id_season": 2}
+    responses:
+      200:
+        description: matched — найдено записей, updated — изменено
+        schema:
+          type: object
+      400:
+        description: Некорректные поля, значения или фильтр
+        schema:
+          type: object
+      404:
+        description: Неизвестная сущность
+        schema:
+          type: object
+      500:
+        description: Ошибка базы данных, изменения не записаны
+    """
+    if entity not in BATCH_ENTITIES:
+        return jsonify({'message': 'Неизвестная сущность'}), 404
+    data = request.json or {}
+    result = batch_update(entity, data.get('values'), data.get('ids'), data.get('filter'))
+    if result['success']:
+        return jsonify(result), 200
+    return jsonify(result), 400 if result.get('invalid') else 500
+
 @app.route('/api/dishes/<int:id>', methods=['DELETE'])
 @admin_required
 def delete_dish(id):
@@ -271,6 +478,12 @@ def delete_dish(id):
         required: true
         description: ID блюда
         example: 1
+      - name: dry_run
+        in: query
+        type: boolean
+        required: false
+        default: false
+        description: Только посчитать затронутые строки, ничего не удаляя
     responses:
       200:
         description: Блюдо удалено
@@ -286,13 +499,14 @@ def delete_dish(id):
           properties:
             message:
               type: string
+      409:
+        description: Удаление запрещено политикой restrict — есть зависимые строки
+        schema:
+          type: object
+      500:
+        description: Ошибка базы данных, удаление не выполнено
     """
-    dish = Dish.query.get(id)
-    if not dish:
-        return jsonify({'message': 'Блюдо не найдено'}), 404
-    db.session.delete(dish)
-    db.session.commit()
-    return jsonify({'message': 'Блюдо удалено'})
+    return delete_response(Dish, id, 'Блюдо удалено', 'Блюдо не найдено')
 
 # Эндпоинты для хранимых процедур
 @app.route('/api/dishes/<int:id>/cost', methods=['GET'])
@@ -318,6 +532,169 @@ def get_dish_cost(id):
     cost = calculate_dish_cost(id)
     return jsonify({'cost': cost})
 
+@app.route('/api/dishes/<int:id>/similar', methods=['GET'])
+def get_similar_dishes_endpoint(id):
+    """
+    Получить блюда с похожим набором продуктов
+    ---
+    tags:
+      - Блюда
+    parameters:
+      - name: id
+        in: path
+        type: integer
+        required: true
+        description: ID блюда
+      - name: n
+        in: query
+        type: integer
+        required: false
+        default: 10
+        description: Количество блюд (не более 100)
+      - name: min_similarity
+        in: query
+        type: number
+        required: false
+        default: 0
+        description: Минимальный коэффициент Жаккара по продуктам (от 0 до 1)
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
+    responses:
+      200:
+        description: >
+          Похожие блюда по убыванию similarity (доля общих продуктов). Кандидаты отбираются по LSH-корзинам
+          MinHash-сигнатур, поэтому блюда с очень малым пересечением могут не попасть в выдачу
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id_dish:
+                type: integer
+              name_dish:
+                type: string
+              similarity:
+                type: number
+              common_products:
+                type: integer
+      404:
+        description: Блюдо не найдено
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+    """
+    if not Dish.query.get(id):
+        return jsonify({'message': 'Блюдо не найдено'}), 404
+    n = min(max(request.args.get('n', 10, type=int), 1), 100)
+    min_similarity = request.args.get('min_similarity', 0.0, type=float)
+    return rows_response(SIMILAR_FIELDS, get_similar_dishes(id, n, min_similarity))
+
+@app.route('/api/dishes/makeable', methods=['POST'])
+@jwt_required()
+def get_makeable_dishes_endpoint():
+    """
+    Какие блюда можно приготовить из продуктов в наличии
+    ---
+    tags:
+      - Блюда
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - products
+          properties:
+            products:
+              type: array
+              description: >
+                Продукты в наличии: id продукта (количество не ограничено)
+                или объект {"id_product": 1, "gramms": 500}
+              items: {}
+              example: [1, 2, {"id_product": 3, "gramms": 500}]
+            max_missing:
+              type: integer
+              description: Сколько ингредиентов может не хватать блюду из near_misses (от 0 до 10, по умолчанию 1)
+              default: 1
+    responses:
+      200:
+        description: >
+          makeable — блюда, все ингредиенты которых есть в нужном количестве;
+          near_misses — блюда, которым не хватает не более max_missing ингредиентов, со списком недостающих
+        schema:
+          type: object
+      400:
+        description: Некорректный список продуктов
+        schema:
+          type: object
+    """
+    data = request.json
+    result = get_makeable_dishes(data.get('products', []), data.get('max_missing', 1))
+    if result['success']:
+        return json_response(result)
+    return jsonify(result), 400
+
+@app.route('/api/dishes/nutrition', methods=['GET'])
+def get_dishes_nutrition():
+    """
+    Стоимость и калорийность блюд
+    ---
+    parameters:
+      - name: ids
+        in: query
+        type: string
+        required: false
+        description: ID блюд через запятую; без параметра — все блюда (массовый режим)
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
+    responses:
+      200:
+        description: Стоимость (по цене за 1 кг продуктов) и калорийность (по ккал на 100 г) блюд
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id_dish:
+                type: integer
+              cost:
+                type: number
+              calories:
+                type: number
+      400:
+        description: Некорректный список ID
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+    """
+    return rows_response(NUTRITION_FIELDS, get_dish_nutrition(dish_ids_arg()))
+
+def dish_ids_arg():
+    ids = request.args.get('ids')
+    if not ids:
+        return None
+    try:
+        return [int(dish_id) for dish_id in ids.split(',') if dish_id.strip()]
+    except ValueError:
+        raise QueryParamError('Параметр ids должен быть списком целых чисел через запятую')
+
 @app.route('/api/dishes/seasonal/<season>', methods=['GET'])
 def get_seasonal_dishes_endpoint(season):
     """
@@ -328,7 +705,19 @@ def get_seasonal_dishes_endpoint(season):
         in: path
         type: string
         required: true
-        description: Название сезона (например, 'Лето')
+        description: ID или название сезона (например, 3 или 'Лето')
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_dish,name_dish')
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список блюд по сезону
@@ -336,15 +725,20 @@ def get_seasonal_dishes_endpoint(season):
           type: array
           items:
             type: object
+            properties:
+              id_dish:
+                type: integer
+              name_dish:
+                type: string
     """
-    dishes = get_seasonal_dishes(season)
-    return jsonify([d.serialize() for d in dishes])
+    serializer = dish_serializer.for_request()
+    return rows_response(serializer.fields, get_seasonal_dishes(season, serializer))
 
 @app.route('/api/ratings', methods=['POST'])
 @jwt_required()
 def add_rating():
     """
-    Добавить или обновить рейтинг блюда
+    Добавить или обновить рейтинг блюда (одна оценка пользователя на блюдо, повторная заменяет прежнюю)
     ---
     security:
       - Bearer: []
@@ -367,8 +761,7 @@ def add_rating():
               type: integer
             comment:
               type: string
-            id_rate:
-              type: integer
+              description: Если не передан при обновлении, прежний комментарий сохраняется
     responses:
       201:
         description: Рейтинг успешно добавлен/обновлён
@@ -384,59 +777,98 @@ def add_rating():
         data['user_id'],
         data['dish_id'],
         data['rate'],
-        data.get('comment'),
-        data.get('id_rate')
+        data.get('comment')
     )
     if result['success']:
         return jsonify(result), 201
     return jsonify(result), 400
 
-@app.route('/api/dishes/<int:dish_id>/change_chef', methods=['POST'])
+@app.route('/api/menus/optimize', methods=['POST'])
 @jwt_required()
-def change_chef(dish_id):
+def optimize_menu_endpoint():
     """
-    Сменить шефа у блюда
+    Подобрать меню сезона с максимальным средним рейтингом
     ---
+    tags:
+      - Меню
     security:
       - Bearer: []
     parameters:
-      - name: dish_id
-        in: path
-        type: integer
-        required: true
-        description: ID блюда
       - in: body
         name: body
         required: true
         schema:
           type: object
           required:
-            - new_chef_id
+            - id_season
+            - size
           properties:
-            new_chef_id:
+            id_season:
+              type: integer
+              description: Сезон блюд; блюда с продуктами другого сезона не рассматриваются
+            size:
+              type: integer
+              description: Количество блюд в меню, от 1 до 100
+              example: 30
+            max_cost:
+              type: number
+              description: Максимальная суммарная стоимость меню
+            min_calories:
+              type: number
+              description: Минимальная калорийность одного блюда
+            max_calories:
+              type: number
+              description: Максимальная калорийность одного блюда
+            required_types:
+              type: array
+              items:
+                type: integer
+              description: ID типов блюд (id_group), каждый из которых должен быть в меню
+            max_per_chief:
               type: integer
+              description: Не больше K блюд одного шефа
+            time_limit:
+              type: number
+              description: Ограничение времени поиска в секундах, больше 0 (по умолчанию 2, не больше 10)
     responses:
       200:
-        description: Шеф успешно изменён
+        description: Подобранное меню; optimal=false, если поиск остановлен по времени
         schema:
           type: object
       400:
-        description: Ошибка при смене шефа
+        description: Меню с такими ограничениями не найдено или параметры некорректны (не числа, вне допустимых границ)
         schema:
           type: object
     """
-    data = request.json
-    result = change_dish_chef(dish_id, data['new_chef_id'])
+    data = request.json or {}
+    try:
+        time_limit = float(data.get('time_limit', MENU_SEARCH_SECONDS))
+    except (TypeError, ValueError):
+        time_limit = None
+    if time_limit is None or not time_limit > 0:
+        return jsonify({'success': False, 'message': 'time_limit должен быть положительным числом секунд'}), 400
+    result = optimize_menu(
+        data.get('id_season'),
+        data.get('size'),
+        max_cost=data.get('max_cost'),
+        min_calories=data.get('min_calories'),
+        max_calories=data.get('max_calories'),
+        required_types=data.get('required_types'),
+        max_per_chief=data.get('max_per_chief'),
+        time_limit=min(time_limit, MENU_SEARCH_MAX_SECONDS)
+    )
     if result['success']:
         return jsonify(result), 200
     return jsonify(result), 400
 
-@app.route('/api/orders', methods=['POST'])
+@app.route('/api/simulations/pricing', methods=['POST'])
 @jwt_required()
-def add_order():
+def simulate_pricing_endpoint():
     """
-    Создать заказ блюда пользователем
+    Смоделировать изменение цен продуктов (в БД ничего не записывается)
     ---
+    tags:
+      - Моделирование
     security:
       - Bearer: []
     parameters:
@@ -446,31 +878,438 @@ def add_order():
         schema:
           type: object
           required:
-            - id_dish
-            - id_user
-          properties:
-            id_dish:
-              type: integer
-            id_user:
+            - changes
+          properties:
+            changes:
+              type: array
+              description: >
+                Правила применяются по порядку. Выбор продуктов: product_ids, id_season или all=true.
+                Изменение: percent (в процентах), delta (абсолютная прибавка) или cost_product (новая цена)
+              items:
+                type: object
+              example: [{"id_season": 1, "percent": 15}]
+            window_days:
               type: integer
+              description: За сколько последних дней брать объём заказов (от 1 до 365, по умолчанию 30)
+              default: 30
     responses:
-      201:
-        description: Заказ успешно создан
+      200:
+        description: Изменение стоимости каждого затронутого блюда и прогноз изменения выручки
         schema:
           type: object
       400:
-        description: Ошибка при создании заказа
+        description: Некорректное правило
         schema:
           type: object
     """
-    data = request.json
-    result = create_order(data['id_dish'], data['id_user'])
+    data = request.json or {}
+    result = simulate_pricing(data.get('changes'), data.get('window_days', 30))
     if result['success']:
-        return jsonify(result), 201
+        return json_response(result)
     return jsonify(result), 400
 
-@app.route('/api/login', methods=['POST'])
-def login():
+@app.route('/api/users/<int:id_user>/recommendations', methods=['GET'])
+@jwt_required()
+def user_recommendations(id_user):
+    """
+    Рекомендации блюд пользователю по похожести блюд (item-item)
+    ---
+    tags:
+      - Рекомендации
+    security:
+      - Bearer: []
+    parameters:
+      - name: id_user
+        in: path
+        type: integer
+        required: true
+        description: ID пользователя
+      - name: n
+        in: query
+        type: integer
+        required: false
+        default: 10
+        description: Количество рекомендаций (не более 100)
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
+    responses:
+      200:
+        description: >
+          Блюда, которые пользователь ещё не оценивал, по убыванию score (сумма похожести, взвешенная его оценками).
+          Если оценок у пользователя нет, отдаются лучшие блюда по рейтингу, score = null
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id_dish:
+                type: integer
+              name_dish:
+                type: string
+              score:
+                type: number
+              predicted_rating:
+                type: number
+    """
+    n = min(max(request.args.get('n', 10, type=int), 1), RECOMMENDATIONS_MAX_N)
+    return rows_response(RECOMMENDATION_FIELDS, get_recommendations(id_user, n))
+
+@app.route('/api/recommendations/rebuild', methods=['POST'])
+@admin_required
+def rebuild_recommendations():
+    """
+    Пересобрать списки похожих блюд целиком в фоне (только для администратора)
+    ---
+    tags:
+      - Рекомендации
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+    responses:
+      202:
+        description: Пересборка поставлена в очередь
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+    """
+    recommendation_job.request_rebuild()
+    return jsonify({'message': 'Пересборка рекомендаций запущена'}), 202
+
+# Эти таблицы и в журнале изменений доступны только администратору, как и их списки
+ADMIN_CHANGE_FEEDS = ('users', 'ratings', 'orders')
+
+@app.route('/api/changes', methods=['GET'])
+@jwt_required()
+def get_changes_endpoint():
+    """
+    Изменения таблиц после заданного номера для инкрементальной синхронизации
+    ---
+    tags:
+      - Синхронизация
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+      - name: since
+        in: query
+        type: integer
+        required: false
+        default: 0
+        description: Номер seq из предыдущего ответа; 0 — с начала журнала
+      - name: tables
+        in: query
+        type: string
+        required: false
+        description: >
+          Таблицы через запятую (dishes, countries, seasons, dishtypes, chiefs, products, recipes;
+          users, ratings, orders — только для администратора). По умолчанию все доступные
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 1000
+        description: Максимум записей в ответе (не больше 5000)
+    responses:
+      200:
+        description: >
+          По одной записи на изменённую строку: последняя операция (insert, update, delete), ключ и текущие
+          данные строки (для delete — null). Следующий запрос — с since=seq; при has_more=true есть ещё записи
+        schema:
+          type: object
+          properties:
+            seq:
+              type: integer
+            has_more:
+              type: boolean
+            changes:
+              type: array
+              items:
+                type: object
+                properties:
+                  seq:
+                    type: integer
+                  table:
+                    type: string
+                  op:
+                    type: string
+                  key:
+                    type: object
+                  row:
+                    type: object
+                  changed_at:
+                    type: string
+      400:
+        description: Неизвестная таблица или отрицательный since
+      403:
+        description: Таблица доступна только администратору
+      410:
+        description: >
+          Журнал до since уже сжат или since больше последнего seq (база восстановлена из снимка):
+          нужно перечитать таблицы целиком и продолжить с seq из ответа
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+            resync:
+              type: boolean
+            seq:
+              type: integer
+            compacted_seq:
+              type: integer
+    """
+    is_admin = get_jwt().get('is_admin')
+    tables = request.args.get('tables')
+    if tables:
+        feeds = list(dict.fromkeys(name.strip() for name in tables.split(',') if name.strip()))
+        unknown = [name for name in feeds if name not in CHANGE_FEEDS]
+        if unknown:
+            raise QueryParamError(f"Неизвестные таблицы: {', '.join(unknown)}")
+        if not is_admin and any(name in ADMIN_CHANGE_FEEDS for name in feeds):
+            return jsonify(msg="Требуются права администратора"), 403
+    else:
+        feeds = [name for name in CHANGE_FEEDS if is_admin or name not in ADMIN_CHANGE_FEEDS]
+    since = request.args.get('since', 0, type=int)
+    if since < 0:
+        raise QueryParamError('Параметр since должен быть неотрицательным целым числом')
+    result = get_changes(since, feeds, request.args.get('limit', CHANGES_LIMIT, type=int))
+    if result.get('resync'):
+        rewound = since > result['seq']
+        return jsonify({
+            'message': (
+                'Журнал изменений откатился (база восстановлена из снимка), перечитайте таблицы целиком'
+                if rewound else 'Журнал изменений сжат, перечитайте таблицы целиком'
+            ),
+            'resync': True,
+            'seq': result['seq'],
+            'compacted_seq': result['compacted_seq']
+        }), 410
+    del result['success']
+    return json_response(result)
+
+@app.route('/api/changes/compact', methods=['POST'])
+@admin_required
+def compact_changes_endpoint():
+    """
+    Сжать журнал изменений: удалить записи старше заданного числа дней (только для администратора)
+    ---
+    tags:
+      - Синхронизация
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+      - name: keep_days
+        in: query
+        type: integer
+        required: false
+        description: Сколько дней журнала оставить (по умолчанию CHANGE_LOG_RETENTION_DAYS)
+    responses:
+      200:
+        description: >
+          Журнал сжат; клиенты, чей since меньше compacted_seq, получат 410 и перечитают таблицы
+        schema:
+          type: object
+          properties:
+            deleted:
+              type: integer
+            compacted_seq:
+              type: integer
+      500:
+        description: Ошибка при сжатии
+    """
+    keep_days = request.args.get('keep_days', app.config['CHANGE_LOG_RETENTION_DAYS'], type=int)
+    result = compact_changes(max(0, keep_days))
+    if not result['success']:
+        return jsonify({'message': result['message']}), 500
+    return jsonify({'deleted': result['deleted'], 'compacted_seq': result['compacted_seq']})
+
+@app.route('/api/backups', methods=['POST'])
+@admin_required
+def create_backup():
+    """
+    Снять резервную копию БД без остановки приложения (только для администратора)
+    ---
+    tags:
+      - Резервные копии
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+    responses:
+      201:
+        description: >
+          Снимок создан. Копирование идёт порциями страниц, между которыми запись в БД не блокируется;
+          восстановление — командой python backup.py restore <файл>
+        schema:
+          type: object
+          properties:
+            name:
+              type: string
+            size:
+              type: integer
+            steps:
+              type: integer
+            seconds:
+              type: number
+      500:
+        description: Ошибка при создании снимка
+    """
+    try:
+        backup = backup_database(backup_dir(app))
+    except Exception as e:
+        app.logger.exception('Backup failed')
+        return jsonify({'message': f'Не удалось создать резервную копию: {e}'}), 500
+    return jsonify(backup), 201
+
+@app.route('/api/backups', methods=['GET'])
+@admin_required
+def get_backups():
+    """
+    Список резервных копий БД, новые первыми (только для администратора)
+    ---
+    tags:
+      - Резервные копии
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+    responses:
+      200:
+        description: Список снимков
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              name:
+                type: string
+              size:
+                type: integer
+              created_at:
+                type: string
+    """
+    return json_response(list_backups(backup_dir(app)))
+
+@app.route('/api/dishes/<int:dish_id>/change_chef', methods=['POST'])
+@jwt_required()
+def change_chef(dish_id):
+    """
+    Сменить шефа у блюда
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - name: dish_id
+        in: path
+        type: integer
+        required: true
+        description: ID блюда
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - new_chef_id
+          properties:
+            new_chef_id:
+              type: integer
+    responses:
+      200:
+        description: Шеф успешно изменён
+        schema:
+          type: object
+      400:
+        description: Ошибка при смене шефа
+        schema:
+          type: object
+    """
+    data = request.json
+    result = change_dish_chef(dish_id, data['new_chef_id'])
+    if result['success']:
+        return jsonify(result), 200
+    return jsonify(result), 400
+
+@app.route('/api/orders', methods=['POST'])
+@jwt_required()
+def add_order():
+    """
+    Создать заказ блюда пользователем
+    ---
+    security:
+      - Bearer: []
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - id_dish
+            - id_user
+          properties:
+            id_dish:
+              type: integer
+            id_user:
+              type: integer
+    responses:
+      201:
+        description: >
+          Заказ успешно создан. При ORDER_BATCHING=1 ответ приходит после коммита пачки,
+          в которую попал заказ, и order_id уже записан в БД
+        schema:
+          type: object
+      400:
+        description: Ошибка при создании заказа
+        schema:
+          type: object
+      503:
+        description: Очередь заказов не успела записать заказ; он может появиться позже
+        schema:
+          type: object
+    """
+    data = request.json
+    if app.config['ORDER_BATCHING']:
+        result = order_batcher.submit(data['id_dish'], data['id_user'])
+    else:
+        result = create_order(data['id_dish'], data['id_user'])
+    if result['success']:
+        return jsonify(result), 201
+    if result.get('timeout'):
+        return jsonify(result), 503
+    return jsonify(result), 400
+
+@app.route('/api/login', methods=['POST'])
+def login():
     """
     Авторизация пользователя
     ---
@@ -512,6 +1351,7 @@ def login():
 
 @app.route('/api/countries', methods=['GET'])
 @jwt_required()
+@cached_payload('country')
 def get_countries():
     """
     Получить список стран
@@ -521,12 +1361,24 @@ def get_countries():
     security:
       - Bearer: []
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_country,name_country')
       - in: header
         name: Authorization
         required: true
         type: string
         description: 'Bearer <ваш_токен_авторизации> (получить через /api/login)'
         example: 'Bearer eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...'
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список стран
@@ -540,8 +1392,7 @@ def get_countries():
               name_country:
                 type: string
     """
-    countries = Country.query.all()
-    return jsonify([{'id_country': c.id_country, 'name_country': c.name_country} for c in countries])
+    return country_serializer.for_request().respond()
 
 @app.route('/api/countries', methods=['POST'])
 @admin_required
@@ -611,6 +1462,12 @@ def delete_country(id_country):
         required: true
         description: ID страны (например, 1)
         example: 1
+      - name: dry_run
+        in: query
+        type: boolean
+        required: false
+        default: false
+        description: Только посчитать затронутые строки, ничего не удаляя
     responses:
       200:
         description: Страна удалена
@@ -619,13 +1476,14 @@ def delete_country(id_country):
           properties:
             message:
               type: string
+      409:
+        description: Удаление запрещено политикой restrict — есть зависимые строки
+        schema:
+          type: object
+      500:
+        description: Ошибка базы данных, удаление не выполнено
     """
-    country = Country.query.get(id_country)
-    if not country:
-        return jsonify({'message': 'Страна не найдена'}), 404
-    db.session.delete(country)
-    db.session.commit()
-    return jsonify({'message': 'Страна удалена'})
+    return delete_response(Country, id_country, 'Страна удалена', 'Страна не найдена')
 
 @app.route('/api/female_users', methods=['POST'])
 @admin_required
@@ -695,91 +1553,551 @@ def add_female_user():
         db.session.rollback()
         return jsonify({'message': str(e)}), 400
 
-@app.route('/api/dishes/search', methods=['GET'])
+@app.route('/api/dishes/search', methods=['GET'])
+@jwt_required()
+def search_dishes():
+    """
+    Поиск блюд по стране, сезону, типу
+    ---
+    tags:
+      - Действия
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_dish,name_dish')
+      - name: country_id
+        in: query
+        type: integer
+        required: false
+        description: ID страны
+      - name: season_id
+        in: query
+        type: integer
+        required: false
+        description: ID сезона
+      - name: group_id
+        in: query
+        type: integer
+        required: false
+        description: ID типа блюда
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
+    responses:
+      200:
+        description: Список найденных блюд
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id_dish:
+                type: integer
+              name_dish:
+                type: string
+    """
+    serializer = dish_serializer.for_request(default=('id_dish', 'name_dish'))
+    return serializer.respond(filter_dishes(serializer.select()))
+
+def filter_dishes(stmt):
+    country_id = request.args.get('country_id', type=int)
+    season_id = request.args.get('season_id', type=int)
+    group_id = request.args.get('group_id', type=int)
+    if country_id:
+        stmt = stmt.where(Dish.id_country == country_id)
+    if season_id:
+        stmt = stmt.where(Dish.id_season == season_id)
+    if group_id:
+        stmt = stmt.where(Dish.id_group == group_id)
+    return stmt
+
+@app.route('/api/reports/dish_ratings', methods=['GET'])
+@jwt_required()
+def report_dish_ratings():
+    """
+    Отчёт: рейтинг блюд с комментариями
+    ---
+    tags:
+      - Отчёты
+    parameters:
+      - name: min_rating
+        in: query
+        type: integer
+        required: false
+        description: Минимальный рейтинг (по умолчанию 3)
+        default: 3
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
+    responses:
+      200:
+        description: Список блюд с рейтингом
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              dish_id:
+                type: integer
+              dish_name:
+                type: string
+              avg_rating:
+                type: number
+              comments:
+                type: string
+    """
+    min_rating = request.args.get('min_rating', 3, type=int)
+    return rows_response(DISH_RATINGS_FIELDS, get_dish_ratings(min_rating))
+
+@app.route('/api/reports/top_dishes', methods=['GET'])
+@jwt_required()
+def report_top_dishes():
+    """
+    Отчёт: топ-N блюд по заказам, рейтингу или выручке
+    ---
+    tags:
+      - Отчёты
+    parameters:
+      - name: by
+        in: query
+        type: string
+        required: false
+        enum: [orders, rating, revenue]
+        default: orders
+        description: Метрика ранжирования
+      - name: window
+        in: query
+        type: string
+        required: false
+        enum: [7d, 30d, all]
+        default: all
+        description: Период, за который считается метрика
+      - name: n
+        in: query
+        type: integer
+        required: false
+        default: 10
+        description: Количество блюд в топе (не более 100)
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
+    responses:
+      200:
+        description: Список блюд, отсортированный по убыванию метрики
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id_dish:
+                type: integer
+              name_dish:
+                type: string
+              value:
+                type: number
+              count:
+                type: integer
+      400:
+        description: Неизвестная метрика или период
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+    """
+    return rows_response(TOP_DISHES_FIELDS, get_top_dishes(*top_dishes_args()))
+
+def top_dishes_args():
+    by = request.args.get('by', 'orders')
+    window = request.args.get('window', 'all')
+    n = request.args.get('n', 10, type=int)
+    if by not in TOP_METRICS:
+        raise QueryParamError('Неизвестная метрика, допустимо: orders, rating, revenue')
+    if window not in TOP_WINDOWS:
+        raise QueryParamError('Неизвестный период, допустимо: 7d, 30d, all')
+    return by, window, n
+
+@app.route('/api/reports/cache_stats', methods=['GET'])
+@admin_required
+def report_cache_stats():
+    """
+    Статистика кэшей отчётов и справочников (только для администратора)
+    ---
+    tags:
+      - Отчёты
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+    responses:
+      200:
+        description: >
+          Для каждого кэша: число записей, лимит, TTL, таблицы, при записи в которые он сбрасывается,
+          попадания, промахи, вытеснения по LRU и доля попаданий
+        schema:
+          type: object
+    """
+    return json_response(cache_stats())
+
+@app.route('/api/reports/season_consistency', methods=['GET'])
+@jwt_required()
+def report_season_consistency():
+    """
+    Отчёт: доля продуктов не по сезону в каждом блюде
+    ---
+    tags:
+      - Отчёты
+    parameters:
+      - name: id_season
+        in: query
+        type: integer
+        required: false
+        description: Только блюда этого сезона (по умолчанию весь каталог)
+      - name: min_share
+        in: query
+        type: number
+        required: false
+        default: 0
+        description: Только блюда, у которых доля граммов или стоимости не по сезону не меньше порога (от 0 до 1)
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
+    responses:
+      200:
+        description: >
+          Блюда по убыванию доли стоимости не по сезону. Продукт считается не по сезону,
+          если его сезон задан и не совпадает с сезоном блюда
+        schema:
+          type: array
+          items:
+            type: object
+            properties:
+              id_dish:
+                type: integer
+              name_dish:
+                type: string
+              id_season:
+                type: integer
+              gramms:
+                type: integer
+              off_season_gramms:
+                type: integer
+              off_season_gramms_share:
+                type: number
+              cost:
+                type: number
+              off_season_cost:
+                type: number
+              off_season_cost_share:
+                type: number
+    """
+    return rows_response(SEASON_CONSISTENCY_FIELDS, get_season_consistency(*season_consistency_args()))
+
+def season_consistency_args():
+    return request.args.get('id_season', type=int), request.args.get('min_share', 0.0, type=float)
+
+# Выгрузка в CSV
+EXPORT_SERIALIZERS = {
+    'dishes': dish_serializer,
+    'countries': country_serializer,
+    'seasons': season_serializer,
+    'dishtypes': dish_type_serializer,
+    'chiefs': chief_serializer,
+    'users': user_serializer,
+    'ratings': rating_serializer,
+    'products': product_serializer,
+    'recipes': recipe_serializer,
+    'orders': order_serializer,
+}
+
+@app.route('/api/export/<table>.csv', methods=['GET'])
+@admin_required
+def export_table_csv(table):
+    """
+    Выгрузить таблицу в CSV потоком (только для администратора)
+    ---
+    tags:
+      - Выгрузка
+    security:
+      - Bearer: []
+    produces:
+      - text/csv
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+        example: 'Bearer eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...'
+      - name: table
+        in: path
+        type: string
+        required: true
+        enum: [dishes, countries, seasons, dishtypes, chiefs, users, ratings, products, recipes, orders]
+        description: Имя таблицы
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (для dishes, например, 'id_dish,name_dish'; для orders — 'id_order,date')
+      - name: country_id
+        in: query
+        type: integer
+        required: false
+        description: Только для dishes — фильтр по стране, как в /api/dishes/search
+      - name: season_id
+        in: query
+        type: integer
+        required: false
+        description: Только для dishes — фильтр по сезону
+      - name: group_id
+        in: query
+        type: integer
+        required: false
+        description: Только для dishes — фильтр по типу блюда
+      - name: date_from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Только для orders и ratings — записи не раньше даты (ГГГГ-ММ-ДД)
+      - name: date_to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Только для orders и ratings — записи не позже даты (ГГГГ-ММ-ДД)
+    responses:
+      200:
+        description: CSV-файл с заголовком из имён полей
+      404:
+        description: Таблица не найдена
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+    """
+    serializer = EXPORT_SERIALIZERS.get(table)
+    if not serializer:
+        return jsonify({'message': 'Таблица не найдена'}), 404
+    serializer = serializer.for_request()
+    stmt = serializer.select()
+    if table == 'dishes':
+        stmt = filter_dishes(stmt)
+    elif table in ('orders', 'ratings'):
+        stmt = partitioned_select(serializer)
+    return serializer.export_csv(table, stmt)
+
+@app.route('/api/reports/<name>.csv', methods=['GET'])
 @jwt_required()
-def search_dishes():
+def export_report_csv(name):
     """
-    Поиск блюд по стране, сезону, типу
+    Выгрузить отчёт в CSV потоком
     ---
     tags:
-      - Действия
+      - Отчёты
+    produces:
+      - text/csv
     parameters:
-      - name: country_id
+      - name: name
+        in: path
+        type: string
+        required: true
+        enum: [dish_ratings, top_dishes, nutrition, season_consistency]
+        description: Имя отчёта
+      - name: min_rating
         in: query
         type: integer
         required: false
-        description: ID страны
-      - name: season_id
+        description: Для dish_ratings — минимальный рейтинг (по умолчанию 3)
+      - name: by
+        in: query
+        type: string
+        required: false
+        description: Для top_dishes — метрика (orders, rating, revenue)
+      - name: window
+        in: query
+        type: string
+        required: false
+        description: Для top_dishes — период (7d, 30d, all)
+      - name: n
         in: query
         type: integer
         required: false
-        description: ID сезона
-      - name: group_id
+        description: Для top_dishes — количество блюд
+      - name: ids
+        in: query
+        type: string
+        required: false
+        description: Для nutrition — ID блюд через запятую
+      - name: id_season
         in: query
         type: integer
         required: false
-        description: ID типа блюда
+        description: Для season_consistency — сезон блюд
+      - name: min_share
+        in: query
+        type: number
+        required: false
+        description: Для season_consistency — минимальная доля не по сезону
     responses:
       200:
-        description: Список найденных блюд
+        description: CSV-файл с заголовком из имён полей
+      404:
+        description: Отчёт не найден
         schema:
-          type: array
-          items:
-            type: object
-            properties:
-              id_dish:
-                type: integer
-              name_dish:
-                type: string
+          type: object
+          properties:
+            message:
+              type: string
     """
-    query = Dish.query
-    country_id = request.args.get('country_id', type=int)
-    season_id = request.args.get('season_id', type=int)
-    group_id = request.args.get('group_id', type=int)
-    if country_id:
-        query = query.filter_by(id_country=country_id)
-    if season_id:
-        query = query.filter_by(id_season=season_id)
-    if group_id:
-        query = query.filter_by(id_group=group_id)
-    dishes = query.all()
-    return jsonify([{'id_dish': d.id_dish, 'name_dish': d.name_dish} for d in dishes])
+    if name == 'dish_ratings':
+        min_rating = request.args.get('min_rating', 3, type=int)
+        rows = stream_rows(dish_ratings_query(min_rating).statement)
+        return csv_response(name, DISH_RATINGS_FIELDS, rows)
+    if name == 'top_dishes':
+        return csv_response(name, TOP_DISHES_FIELDS, get_top_dishes(*top_dishes_args()))
+    if name == 'nutrition':
+        return csv_response(name, NUTRITION_FIELDS, get_dish_nutrition(dish_ids_arg()))
+    if name == 'season_consistency':
+        return csv_response(name, SEASON_CONSISTENCY_FIELDS, get_season_consistency(*season_consistency_args()))
+    return jsonify({'message': 'Отчёт не найден'}), 404
 
-@app.route('/api/reports/dish_ratings', methods=['GET'])
+def nutrition_job_args():
+    dish_ids = dish_ids_arg()
+    return (None if dish_ids is None else tuple(dish_ids),)
+
+# Отчёты для фонового расчёта: поля, таблицы-источники, функция и разбор параметров запроса
+REPORT_JOBS = {
+    'dish_ratings': (
+        DISH_RATINGS_FIELDS, ('dish', 'dish_rating') + ARCHIVE_TABLES, get_dish_ratings,
+        lambda: (request.args.get('min_rating', 3, type=int),)
+    ),
+    'top_dishes': (
+        TOP_DISHES_FIELDS,
+        ('dish', 'dish_rating', 'dish_rating_stats', 'order_of_dishes', 'recipe', 'product') + ARCHIVE_TABLES,
+        get_top_dishes, top_dishes_args
+    ),
+    'nutrition': (NUTRITION_FIELDS, ENGINE_TABLES, get_dish_nutrition, nutrition_job_args),
+    'season_consistency': (
+        SEASON_CONSISTENCY_FIELDS, ('dish', 'recipe', 'product'), get_season_consistency, season_consistency_args
+    ),
+}
+
+@app.route('/api/reports/<name>/jobs', methods=['POST'])
 @jwt_required()
-def report_dish_ratings():
+def create_report_job(name):
     """
-    Отчёт: рейтинг блюд с комментариями
+    Запустить расчёт отчёта в фоне
     ---
     tags:
       - Отчёты
+    security:
+      - Bearer: []
     parameters:
-      - name: min_rating
-        in: query
-        type: integer
-        required: false
-        description: Минимальный рейтинг (по умолчанию 3)
-        default: 3
+      - name: name
+        in: path
+        type: string
+        required: true
+        enum: [dish_ratings, top_dishes, nutrition, season_consistency]
+        description: Имя отчёта; параметры передаются в query string, как у GET-версии отчёта
+    responses:
+      202:
+        description: >
+          Задание создано или найдено готовое с теми же параметрами (reused = true).
+          Статус и результат — GET /api/jobs/{id}
+        schema:
+          type: object
+          properties:
+            id:
+              type: string
+            status:
+              type: string
+            reused:
+              type: boolean
+      400:
+        description: Некорректные параметры отчёта
+        schema:
+          type: object
+      404:
+        description: Отчёт не найден
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
+      503:
+        description: Очередь фоновых отчётов заполнена, повторить после Retry-After секунд
+    """
+    if name not in REPORT_JOBS:
+        return jsonify({'message': 'Отчёт не найден'}), 404
+    fields, tables, compute, parse_args = REPORT_JOBS[name]
+    try:
+        job, reused = report_jobs.submit(app, name, fields, tables, compute, parse_args())
+    except JobQueueFull:
+        return jsonify({'message': 'Слишком много отчётов в очереди, повторите позже'}), 503, {'Retry-After': '5'}
+    response = jsonify({'id': job.id, 'status': job.status, 'reused': reused})
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response, 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_report_job(job_id):
+    """
+    Статус и результат фонового расчёта отчёта
+    ---
+    tags:
+      - Отчёты
+    security:
+      - Bearer: []
+    parameters:
+      - name: job_id
+        in: path
+        type: string
+        required: true
+        description: ID задания
     responses:
       200:
-        description: Список блюд с рейтингом
+        description: >
+          status — queued, running, done или failed; при done в result строки отчёта, при failed — error.
+          Готовые задания хранятся 10 минут
         schema:
-          type: array
-          items:
-            type: object
-            properties:
-              dish_id:
-                type: integer
-              dish_name:
-                type: string
-              avg_rating:
-                type: number
-              comments:
-                type: string
+          type: object
+      404:
+        description: Задание не найдено или срок хранения истёк
+        schema:
+          type: object
+          properties:
+            message:
+              type: string
     """
-    min_rating = request.args.get('min_rating', 3, type=int)
-    result = get_dish_ratings(min_rating)
-    return jsonify(result)
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'message': 'Задание не найдено'}), 404
+    return json_response(job.to_dict())
 
 @app.route('/api/register', methods=['POST'])
 def register():
@@ -852,12 +2170,36 @@ def get_orders():
     security:
       - Bearer: []
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_order,date')
       - in: header
         name: Authorization
         required: true
         type: string
         description: 'Bearer <ваш_токен_авторизации>'
         example: 'Bearer eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...'
+      - name: date_from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Только записи не раньше даты (ГГГГ-ММ-ДД). Архив читается, только если дата раньше его отсечки
+      - name: date_to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Только записи не позже даты (ГГГГ-ММ-ДД)
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список заказов
@@ -875,11 +2217,8 @@ def get_orders():
               date:
                 type: string
     """
-    orders = OrderOfDishes.query.all()
-    return jsonify([
-        {'id_order': o.id_order, 'id_dish': o.id_dish, 'id_user': o.id_user, 'date': o.date.isoformat() if o.date else None}
-        for o in orders
-    ])
+    serializer = order_serializer.for_request()
+    return serializer.respond(partitioned_select(serializer))
 
 @app.route('/api/ratings', methods=['GET'])
 @admin_required
@@ -892,12 +2231,36 @@ def get_ratings():
     security:
       - Bearer: []
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_dish,rate')
       - in: header
         name: Authorization
         required: true
         type: string
         description: 'Bearer <ваш_токен_авторизации>'
         example: 'Bearer eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...'
+      - name: date_from
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Только записи не раньше даты (ГГГГ-ММ-ДД). Архив читается, только если дата раньше его отсечки
+      - name: date_to
+        in: query
+        type: string
+        format: date
+        required: false
+        description: Только записи не позже даты (ГГГГ-ММ-ДД)
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список рейтингов
@@ -919,19 +2282,43 @@ def get_ratings():
               date:
                 type: string
     """
-    ratings = DishRating.query.all()
-    return jsonify([
-        {'id_rate': r.id_rate, 'id_user': r.id_user, 'id_dish': r.id_dish, 'rate': r.rate, 'comment': r.comment, 'date': r.date.isoformat() if r.date else None}
-        for r in ratings
-    ])
+    serializer = rating_serializer.for_request()
+    return serializer.respond(partitioned_select(serializer))
+
+def date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise QueryParamError(f'Параметр {name} должен быть датой в формате ГГГГ-ММ-ДД')
+
+def partitioned_select(serializer):
+    # Заказы и оценки старше отсечки лежат в архивных таблицах, см. archive_service
+    return select_partitioned(serializer.model, serializer.fields, date_arg('date_from'), date_arg('date_to'))
 
 @app.route('/api/seasons', methods=['GET'])
+@cached_payload('season')
 def get_seasons():
     """
     Получить список сезонов
     ---
     tags:
       - Справочники
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_season,name_season')
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список сезонов
@@ -945,16 +2332,29 @@ def get_seasons():
               name_season:
                 type: string
     """
-    seasons = Season.query.all()
-    return jsonify([{'id_season': s.id_season, 'name_season': s.name_season} for s in seasons])
+    return season_serializer.for_request().respond()
 
 @app.route('/api/dishtypes', methods=['GET'])
+@cached_payload('dish_type')
 def get_dishtypes():
     """
     Получить список типов блюд
     ---
     tags:
       - Справочники
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_group,type')
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список типов блюд
@@ -968,16 +2368,29 @@ def get_dishtypes():
               type:
                 type: string
     """
-    types = DishType.query.all()
-    return jsonify([{'id_group': t.id_group, 'type': t.type} for t in types])
+    return dish_type_serializer.for_request().respond()
 
 @app.route('/api/chiefs', methods=['GET'])
+@cached_payload('chief')
 def get_chiefs():
     """
     Получить список шефов
     ---
     tags:
       - Справочники
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_chief,name_chief')
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список шефов
@@ -995,11 +2408,7 @@ def get_chiefs():
               exp_years:
                 type: integer
     """
-    chiefs = Chief.query.all()
-    return jsonify([
-        {'id_chief': c.id_chief, 'name_chief': c.name_chief, 'id_country': c.id_country, 'exp_years': c.exp_years}
-        for c in chiefs
-    ])
+    return chief_serializer.for_request().respond()
 
 @app.route('/api/users', methods=['GET'])
 @admin_required
@@ -1012,12 +2421,24 @@ def get_users():
     security:
       - Bearer: []
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_user,name_user')
       - in: header
         name: Authorization
         required: true
         type: string
         description: 'Bearer <ваш_токен_авторизации>'
         example: 'Bearer eyJ0eXAiOiJKV1QiLCJhbGciOiJIUzI1NiJ9...'
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список пользователей
@@ -1041,19 +2462,29 @@ def get_users():
               is_admin:
                 type: boolean
     """
-    users = Human.query.all()
-    return jsonify([
-        {'id_user': u.id_user, 'name_user': u.name_user, 'email': u.email, 'age': u.age.isoformat() if u.age else None, 'id_country': u.id_country, 'sex': u.sex, 'is_admin': u.is_admin}
-        for u in users
-    ])
+    return user_serializer.for_request().respond()
 
 @app.route('/api/products', methods=['GET'])
+@cached_payload('product')
 def get_products():
     """
     Получить список продуктов
     ---
     tags:
       - Справочники
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_prod,name_product')
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список продуктов
@@ -1073,19 +2504,29 @@ def get_products():
               id_season:
                 type: integer
     """
-    products = Product.query.all()
-    return jsonify([
-        {'id_prod': p.id_prod, 'name_product': p.name_product, 'calories': p.calories, 'cost_product': p.cost_product, 'id_season': p.id_season}
-        for p in products
-    ])
+    return product_serializer.for_request().respond()
 
 @app.route('/api/recipes', methods=['GET'])
+@cached_payload('recipe')
 def get_recipes():
     """
     Получить список рецептов
     ---
     tags:
       - Справочники
+    parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_product,gramms')
+      - name: format
+        in: query
+        type: string
+        required: false
+        enum: [records, columnar]
+        default: records
+        description: "columnar — ответ вида {columns: [...], data: {колонка: [значения...]}}"
     responses:
       200:
         description: Список рецептов
@@ -1101,11 +2542,7 @@ def get_recipes():
               gramms:
                 type: integer
     """
-    recipes = Recipe.query.all()
-    return jsonify([
-        {'id_dish': r.id_dish, 'id_product': r.id_product, 'gramms': r.gramms}
-        for r in recipes
-    ])
+    return recipe_serializer.for_request().respond()
 
 @app.route('/api/products', methods=['POST'])
 @admin_required
@@ -1167,6 +2604,7 @@ def create_product():
     )
     db.session.add(product)
     db.session.commit()
+    nutrition_engine.set_product(product.id_prod, product.cost_product, product.calories)
     return jsonify({'id_prod': product.id_prod, 'name_product': product.name_product}), 201
 
 @app.route('/api/products/<int:id_prod>', methods=['GET'])
@@ -1177,6 +2615,11 @@ def get_product(id_prod):
     tags:
       - Продукты
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_prod,name_product')
       - name: id_prod
         in: path
         type: integer
@@ -1207,16 +2650,10 @@ def get_product(id_prod):
             message:
               type: string
     """
-    product = Product.query.get(id_prod)
+    product = product_serializer.for_request().fetch_by_pk(id_prod)
     if not product:
         return jsonify({'message': 'Продукт не найден'}), 404
-    return jsonify({
-        'id_prod': product.id_prod,
-        'name_product': product.name_product,
-        'calories': product.calories,
-        'cost_product': product.cost_product,
-        'id_season': product.id_season
-    })
+    return json_response(product)
 
 @app.route('/api/products/<int:id_prod>', methods=['PUT'])
 @admin_required
@@ -1283,6 +2720,7 @@ def update_product(id_prod):
         if key in data:
             setattr(product, key, data[key])
     db.session.commit()
+    nutrition_engine.set_product(product.id_prod, product.cost_product, product.calories)
     return jsonify({'message': 'Продукт обновлён'})
 
 @app.route('/api/products/<int:id_prod>', methods=['DELETE'])
@@ -1308,6 +2746,12 @@ def delete_product(id_prod):
         required: true
         description: ID продукта
         example: 1
+      - name: dry_run
+        in: query
+        type: boolean
+        required: false
+        default: false
+        description: Только посчитать затронутые строки, ничего не удаляя
     responses:
       200:
         description: Продукт удалён
@@ -1323,13 +2767,17 @@ def delete_product(id_prod):
           properties:
             message:
               type: string
+      409:
+        description: Удаление запрещено политикой restrict — есть зависимые строки
+        schema:
+          type: object
+      500:
+        description: Ошибка базы данных, удаление не выполнено
     """
-    product = Product.query.get(id_prod)
-    if not product:
-        return jsonify({'message': 'Продукт не найден'}), 404
-    db.session.delete(product)
-    db.session.commit()
-    return jsonify({'message': 'Продукт удалён'})
+    response, status = delete_response(Product, id_prod, 'Продукт удалён', 'Продукт не найден')
+    if status == 200 and not request.args.get('dry_run', type=dry_run_arg):
+        nutrition_engine.remove_product(id_prod)
+    return response, status
 
 @app.route('/api/dishtypes', methods=['POST'])
 @admin_required
@@ -1384,6 +2832,11 @@ def get_dishtype(id_group):
     tags:
       - Типы блюд
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_group,type')
       - name: id_group
         in: path
         type: integer
@@ -1408,10 +2861,10 @@ def get_dishtype(id_group):
             message:
               type: string
     """
-    dishtype = DishType.query.get(id_group)
+    dishtype = dish_type_serializer.for_request().fetch_by_pk(id_group)
     if not dishtype:
         return jsonify({'message': 'Тип блюда не найден'}), 404
-    return jsonify({'id_group': dishtype.id_group, 'type': dishtype.type})
+    return json_response(dishtype)
 
 @app.route('/api/dishtypes/<int:id_group>', methods=['PUT'])
 @admin_required
@@ -1664,6 +3117,8 @@ def create_recipe():
     )
     db.session.add(recipe)
     db.session.commit()
+    nutrition_engine.set_recipe(recipe.id_dish, recipe.id_product, recipe.gramms)
+    similarity_index.set_recipe(recipe.id_dish, recipe.id_product)
     return jsonify({'id_dish': recipe.id_dish, 'id_product': recipe.id_product, 'gramms': recipe.gramms}), 201
 
 @app.route('/api/recipes/<int:id_dish>/<int:id_product>', methods=['GET'])
@@ -1674,6 +3129,11 @@ def get_recipe(id_dish, id_product):
     tags:
       - Рецепты
     parameters:
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Список полей через запятую (например, 'id_product,gramms')
       - name: id_dish
         in: path
         type: integer
@@ -1706,10 +3166,10 @@ def get_recipe(id_dish, id_product):
             message:
               type: string
     """
-    recipe = Recipe.query.get((id_dish, id_product))
+    recipe = recipe_serializer.for_request().fetch_by_pk(id_dish, id_product)
     if not recipe:
         return jsonify({'message': 'Рецепт не найден'}), 404
-    return jsonify({'id_dish': recipe.id_dish, 'id_product': recipe.id_product, 'gramms': recipe.gramms})
+    return json_response(recipe)
 
 @app.route('/api/recipes/<int:id_dish>/<int:id_product>', methods=['PUT'])
 @admin_required
@@ -1772,6 +3232,8 @@ def update_recipe(id_dish, id_product):
     if 'gramms' in data:
         recipe.gramms = data['gramms']
     db.session.commit()
+    nutrition_engine.set_recipe(id_dish, id_product, recipe.gramms)
+    similarity_index.set_recipe(id_dish, id_product)
     return jsonify({'message': 'Рецепт обновлён'})
 
 @app.route('/api/recipes/<int:id_dish>/<int:id_product>', methods=['DELETE'])
@@ -1824,6 +3286,8 @@ def delete_recipe(id_dish, id_product):
         return jsonify({'message': 'Рецепт не найден'}), 404
     db.session.delete(recipe)
     db.session.commit()
+    nutrition_engine.remove_recipe(id_dish, id_product)
+    similarity_index.remove_recipe(id_dish, id_product)
     return jsonify({'message': 'Рецепт удалён'})
 
 @app.route('/api/users', methods=['POST'])
@@ -1922,6 +3386,12 @@ def delete_user(id_user):
         required: true
         description: ID пользователя
         example: 1
+      - name: dry_run
+        in: query
+        type: boolean
+        required: false
+        default: false
+        description: Только посчитать затронутые строки, ничего не удаляя
     responses:
       200:
         description: Пользователь удалён
@@ -1937,13 +3407,14 @@ def delete_user(id_user):
           properties:
             message:
               type: string
+      409:
+        description: Удаление запрещено политикой restrict — есть зависимые строки
+        schema:
+          type: object
+      500:
+        description: Ошибка базы данных, удаление не выполнено
     """
-    user = Human.query.get(id_user)
-    if not user:
-        return jsonify({'message': 'Пользователь не найден'}), 404
-    db.session.delete(user)
-    db.session.commit()
-    return jsonify({'message': 'Пользователь удалён'})
+    return delete_response(Human, id_user, 'Пользователь удалён', 'Пользователь не найден')
 
 @app.route('/api/orders/<int:id_order>', methods=['DELETE'])
 @admin_required
@@ -1984,12 +3455,8 @@ def delete_order(id_order):
             message:
               type: string
     """
-    order = OrderOfDishes.query.get(id_order)
-    if not order:
-        return jsonify({'message': 'Заказ не найден'}), 404
-    db.session.delete(order)
-    db.session.commit()
-    return jsonify({'message': 'Заказ удалён'})
+    # Заказ может лежать и в архиве: delete_service удаляет из обеих частей таблицы
+    return delete_response(OrderOfDishes, id_order, 'Заказ удалён', 'Заказ не найден')
 
 @app.route('/api/ratings/<int:id_rate>', methods=['DELETE'])
 @admin_required
@@ -2030,12 +3497,67 @@ def delete_rating(id_rate):
             message:
               type: string
     """
-    rating = DishRating.query.get(id_rate)
-    if not rating:
-        return jsonify({'message': 'Рейтинг не найден'}), 404
-    db.session.delete(rating)
-    db.session.commit()
-    return jsonify({'message': 'Рейтинг удалён'})
+    return delete_response(DishRating, id_rate, 'Рейтинг удалён', 'Рейтинг не найден')
+
+@app.route('/api/chiefs/<int:id_chief>/reassign_dishes', methods=['POST'])
+@admin_required
+def reassign_dishes(id_chief):
+    """
+    Передать блюда шефа другому шефу или распределить между несколькими (только для администратора)
+    ---
+    tags:
+      - Шефы
+    security:
+      - Bearer: []
+    parameters:
+      - in: header
+        name: Authorization
+        required: true
+        type: string
+        description: 'Bearer <ваш_токен_авторизации>'
+      - name: id_chief
+        in: path
+        type: integer
+        required: true
+        description: ID шефа, чьи блюда передаются
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          properties:
+            new_chef_id:
+              type: integer
+              description: Один целевой шеф
+            chef_ids:
+              type: array
+              items:
+                type: integer
+              description: >
+                Несколько целевых шефов (вместо new_chef_id): блюда распределяются так,
+                чтобы выровнять число блюд у каждого с учётом уже имеющихся
+              example: [2, 3]
+            dish_ids:
+              type: array
+              items:
+                type: integer
+              description: Передать только эти блюда (по умолчанию все блюда шефа)
+    responses:
+      200:
+        description: mapping — для каждого блюда старый и новый шеф, loads — число блюд у целевых шефов после передачи
+        schema:
+          type: object
+      400:
+        description: Шеф не найден или chef_ids, dish_ids — не списки целых id
+        schema:
+          type: object
+    """
+    data = request.json or {}
+    new_chef_ids = data.get('chef_ids') or ([data['new_chef_id']] if 'new_chef_id' in data else [])
+    result = reassign_chef_dishes(id_chief, new_chef_ids, data.get('dish_ids'))
+    if result['success']:
+        return json_response(result)
+    return jsonify(result), 400
 
 @app.route('/api/chiefs', methods=['POST'])
 @admin_required
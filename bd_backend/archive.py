@@ -0,0 +1,17 @@
+import argparse
+from datetime import date, timedelta
+
+from app import app
+from services.archive_service import archive_before, ARCHIVE_BATCH
+
+parser = argparse.ArgumentParser(description='Перенос старых заказов и оценок в архивные таблицы')
+cutoff = parser.add_mutually_exclusive_group(required=True)
+cutoff.add_argument('--before', type=date.fromisoformat, help='Переносить строки с датой раньше ГГГГ-ММ-ДД')
+cutoff.add_argument('--days', type=int, help='Переносить строки старше N дней')
+parser.add_argument('--batch', type=int, default=ARCHIVE_BATCH, help='Строк в одной транзакции')
+args = parser.parse_args()
+
+with app.app_context():
+    before = args.before or date.today() - timedelta(days=args.days)
+    for table, moved in archive_before(before, args.batch).items():
+        print(f"{table}: перенесено в архив {moved} строк с датой раньше {before}")
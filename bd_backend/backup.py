@@ -0,0 +1,23 @@
+import argparse
+
+from app import app, db
+from services.backup_service import backup_database, backup_dir, restore_database
+
+parser = argparse.ArgumentParser(description='Резервные копии БД: снимок без остановки приложения и быстрое восстановление')
+commands = parser.add_subparsers(dest='command', required=True)
+create = commands.add_parser('create', help='Снять снимок через online backup API SQLite')
+create.add_argument('--dir', help='Каталог снимков (по умолчанию BACKUP_DIR или instance/backups)')
+restore = commands.add_parser('restore', help='Подменить файл БД снимком (заодно способ развернуть тестовую БД)')
+restore.add_argument('snapshot', help='Файл снимка')
+restore.add_argument('--target', help='Файл БД, в который разворачивается снимок (по умолчанию БД приложения)')
+args = parser.parse_args()
+
+with app.app_context():
+    if args.command == 'create':
+        backup = backup_database(args.dir or backup_dir(app))
+        print(f"Снимок {backup['name']}: {backup['size']} байт за {backup['seconds']} с")
+    else:
+        db.engine.dispose()
+        restored = restore_database(args.snapshot, args.target)
+        print(f"БД {restored['target']} восстановлена из {args.snapshot}")
+        print("Работающее приложение нужно перезапустить, чтобы оно открыло новый файл")
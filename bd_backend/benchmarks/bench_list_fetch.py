@@ -0,0 +1,63 @@
+"""Сравнение чтения списков через ORM (Model.query.all()) и через Core (ModelSerializer.fetch).
+
+Запуск из каталога bd_backend:
+    python -m benchmarks.bench_list_fetch [количество_строк]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from flask import Flask
+
+from models import db, OrderOfDishes
+from serializers import order_serializer
+
+
+def populate(n):
+    start = date(2024, 1, 1)
+    db.session.execute(
+        OrderOfDishes.__table__.insert(),
+        [{'id_dish': i % 500, 'id_user': i % 3000, 'date': start + timedelta(days=i % 365)} for i in range(n)]
+    )
+    db.session.commit()
+
+
+def orm_path():
+    return order_serializer.many(OrderOfDishes.query.all())
+
+
+def core_path():
+    return order_serializer.fetch()
+
+
+def measure(read):
+    db.session.expunge_all()
+    started = time.perf_counter()
+    read()
+    elapsed = time.perf_counter() - started
+    db.session.expunge_all()
+    tracemalloc.start()
+    read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.expunge_all()
+    return elapsed, peak
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        populate(n)
+        print(f'rows: {n}')
+        for name, read in (('orm', orm_path), ('core', core_path)):
+            elapsed, peak = measure(read)
+            print(f'{name:5} {elapsed * 1000:8.1f} ms  {elapsed / n * 1e6:6.2f} us/row  peak {peak / 1e6:7.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
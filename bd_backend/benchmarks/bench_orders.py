@@ -0,0 +1,59 @@
+"""Приём заказов: коммит на каждый заказ (create_order) против группового коммита (OrderBatcher).
+
+БД — файл SQLite во временном каталоге: выигрыш группового коммита — в числе fsync.
+Запуск из каталога bd_backend:
+    python -m benchmarks.bench_orders [заказов] [потоков]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from flask import Flask
+
+from models import db, OrderOfDishes
+from services.order_service import create_order, OrderBatcher
+
+
+def run_clients(app, submit, orders, clients):
+    per_client = orders // clients
+    failed = []
+
+    def client(offset):
+        with app.app_context():
+            for i in range(per_client):
+                if not submit(1 + (offset + i) % 500, 1 + i % 3000)['success']:
+                    failed.append(offset + i)
+            db.session.remove()
+
+    threads = [threading.Thread(target=client, args=(c * per_client,)) for c in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return per_client * clients, len(failed), time.perf_counter() - started
+
+
+def main():
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    with tempfile.TemporaryDirectory() as directory:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(directory, 'orders.db')
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+        batcher = OrderBatcher()
+        batcher.start(app)
+        print(f'orders: {orders}  clients: {clients}')
+        for name, submit in (('commit per order', create_order), ('group commit', batcher.submit)):
+            total, failed, elapsed = run_clients(app, submit, orders, clients)
+            print(f'{name:17} {total / elapsed:9.0f} orders/s  {elapsed:6.2f} s  failed: {failed}')
+        with app.app_context():
+            print(f'rows written: {OrderOfDishes.query.count()}')
+
+
+if __name__ == '__main__':
+    main()
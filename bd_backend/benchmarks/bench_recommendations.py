@@ -0,0 +1,71 @@
+"""Рекомендации item-item: полная сборка соседей, инкрементальное обновление и время ответа.
+
+Запуск из каталога bd_backend:
+    python -m benchmarks.bench_recommendations [оценок] [блюд] [пользователей]
+"""
+import random
+import sys
+import time
+from datetime import datetime
+
+from flask import Flask
+
+from models import db, Dish, DishRating
+from services.recommendation_service import rebuild_neighbors, refresh_neighbors, get_recommendations
+
+
+def populate(n, dishes, users):
+    random.seed(0)
+    db.session.execute(Dish.__table__.insert(), [{'id_dish': i, 'name_dish': f'dish {i}'} for i in range(1, dishes + 1)])
+    # Популярность блюд по закону Ципфа: у реальных оценок длинный хвост
+    weights = [1 / rank for rank in range(1, dishes + 1)]
+    now = datetime.now()
+    for start in range(0, n, 100_000):
+        size = min(100_000, n - start)
+        picked = random.choices(range(1, dishes + 1), weights=weights, k=size)
+        # Повторные пары (пользователь, блюдо) отбрасывает уникальный индекс
+        db.session.execute(
+            DishRating.__table__.insert().prefix_with('OR IGNORE'),
+            [
+                {'id_user': random.randint(1, users), 'id_dish': id_dish, 'rate': random.randint(1, 5), 'date': now}
+                for id_dish in picked
+            ]
+        )
+    db.session.commit()
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    dishes = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    users = int(sys.argv[3]) if len(sys.argv) > 3 else 100_000
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        populate(n, dishes, users)
+        print(f'ratings: {DishRating.query.count()}  dishes: {dishes}  users: {users}')
+
+        built, elapsed = timed(rebuild_neighbors)
+        print(f'full build     {elapsed * 1000:9.1f} ms  ({built} dishes)')
+
+        dirty = random.sample(range(1, dishes + 1), 100)
+        refreshed, elapsed = timed(refresh_neighbors, dirty)
+        print(f'refresh 100    {elapsed * 1000:9.1f} ms  ({refreshed} lists rewritten)')
+
+        sample = random.sample(range(1, users + 1), 200)
+        started = time.perf_counter()
+        for id_user in sample:
+            get_recommendations(id_user, 10)
+        elapsed = (time.perf_counter() - started) / len(sample)
+        print(f'recommend      {elapsed * 1000:9.2f} ms/request')
+
+
+if __name__ == '__main__':
+    main()
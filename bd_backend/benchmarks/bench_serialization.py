@@ -0,0 +1,78 @@
+"""Сравнение старой (dict + jsonify) и новой (ModelSerializer + dumps) сериализации.
+
+Запуск из каталога bd_backend:
+    python -m benchmarks.bench_serialization [количество_строк]
+"""
+import sys
+import time
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from flask import Flask, jsonify
+
+from serializers import order_serializer, rating_serializer, json_response, orjson
+
+
+def make_orders(n):
+    start = date(2024, 1, 1)
+    return [
+        SimpleNamespace(id_order=i, id_dish=i % 500, id_user=i % 3000, date=start + timedelta(days=i % 365))
+        for i in range(n)
+    ]
+
+
+def make_ratings(n):
+    start = date(2024, 1, 1)
+    return [
+        SimpleNamespace(id_rate=i, id_user=i % 3000, id_dish=i % 500, rate=i % 5 + 1,
+                        comment='Очень вкусно, возьму ещё' if i % 3 else None,
+                        date=start + timedelta(days=i % 365))
+        for i in range(n)
+    ]
+
+
+def old_orders(orders):
+    return jsonify([
+        {'id_order': o.id_order, 'id_dish': o.id_dish, 'id_user': o.id_user, 'date': o.date.isoformat() if o.date else None}
+        for o in orders
+    ])
+
+
+def old_ratings(ratings):
+    return jsonify([
+        {'id_rate': r.id_rate, 'id_user': r.id_user, 'id_dish': r.id_dish, 'rate': r.rate, 'comment': r.comment, 'date': r.date.isoformat() if r.date else None}
+        for r in ratings
+    ])
+
+
+def measure(build, data, repeat=5):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = build(data)
+        elapsed = time.perf_counter() - started
+        size = len(response.get_data())
+        best = elapsed if best is None else min(best, elapsed)
+    return size, best
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    app = Flask(__name__)
+    cases = [
+        ('orders', make_orders(n), old_orders, lambda rows: json_response(order_serializer.many(rows))),
+        ('ratings', make_ratings(n), old_ratings, lambda rows: json_response(rating_serializer.many(rows))),
+    ]
+    print(f'rows: {n}, encoder: {"orjson" if orjson else "json (stdlib)"}')
+    with app.app_context():
+        for name, data, old, new in cases:
+            old_size, old_time = measure(old, data)
+            new_size, new_time = measure(new, data)
+            print(f'{name:8} before: {old_size / old_time / 1e6:8.1f} MB/s ({old_time * 1000:7.1f} ms)'
+                  f'  after: {new_size / new_time / 1e6:8.1f} MB/s ({new_time * 1000:7.1f} ms)'
+                  f'  speedup: x{old_time / new_time:.1f}')
+
+
+if __name__ == '__main__':
+    main()
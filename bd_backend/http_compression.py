@@ -0,0 +1,126 @@
+import gzip
+from functools import wraps
+
+from flask import current_app, request, Response
+
+from services.cache_service import TTLCache, tables_version
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/csv', 'text/plain'}
+
+
+def _gzip(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=min(level, 11))
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+# Порядок важен: при равном q у клиента выбираем первый подходящий
+COMPRESSORS = {}
+if brotli is not None:
+    COMPRESSORS['br'] = _brotli
+if zstandard is not None:
+    COMPRESSORS['zstd'] = _zstd
+COMPRESSORS['gzip'] = _gzip
+
+
+def negotiate_encoding(size):
+    if size < current_app.config['COMPRESS_MIN_SIZE']:
+        return None
+    return request.accept_encodings.best_match(list(COMPRESSORS))
+
+
+def compress(data, encoding):
+    return COMPRESSORS[encoding](data, current_app.config['COMPRESS_LEVEL'])
+
+
+def _set_encoding_headers(response, encoding):
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+
+
+def compress_response(response):
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or 'Accept-Encoding' in response.vary
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    encoding = negotiate_encoding(len(data))
+    if encoding:
+        response.set_data(compress(data, encoding))
+    _set_encoding_headers(response, encoding)
+    return response
+
+
+def register_compression(app):
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.after_request(compress_response)
+
+
+class CompressedPayload:
+    """Готовое тело ответа и его сжатые варианты: каждое сжатие выполняется один раз."""
+
+    def __init__(self, data, mimetype):
+        self.data = data
+        self.mimetype = mimetype
+        self.variants = {}
+
+    def body(self, encoding):
+        if encoding is None:
+            return self.data
+        body = self.variants.get(encoding)
+        if body is None:
+            body = self.variants[encoding] = compress(self.data, encoding)
+        return body
+
+    def response(self):
+        encoding = negotiate_encoding(len(self.data))
+        response = Response(self.body(encoding), mimetype=self.mimetype)
+        # Vary: Accept-Encoding выставлен всегда, поэтому after_request не сожмёт ответ повторно
+        _set_encoding_headers(response, encoding)
+        return response
+
+
+def cached_payload(*tables, ttl=300, params=('fields', 'format'), max_size=256):
+    """Кэширует тело ответа справочного эндпоинта вместе со сжатыми вариантами.
+
+    Ключ — аргументы пути и только те параметры запроса, которые читает эндпоинт (params):
+    посторонние параметры не плодят записей, а число записей ограничено max_size.
+    """
+    def decorator(fn):
+        cache = TTLCache(ttl=ttl, tables=tables, max_size=max_size, name=f'payload:{fn.__name__}')
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())), tuple(request.args.get(param) for param in params))
+            payload = cache.get(key)
+            if payload is None:
+                version = tables_version(tables)
+                response = fn(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+                payload = CompressedPayload(response.get_data(), response.mimetype)
+                cache.set(key, payload, version)
+            return payload.response()
+        return wrapper
+    return decorator
@@ -0,0 +1,9 @@
+from app import app
+from services.schema_service import migrate_schema
+
+# Разовые миграции данных после обновления приложения; при импорте app выполняется только create_all и индексы
+with app.app_context():
+    done = migrate_schema()
+    for step in done:
+        print(step)
+    print("Миграция завершена" if done else "БД уже в актуальном состоянии")
@@ -10,7 +10,7 @@ class Country(db.Model):
 class Season(db.Model):
     __tablename__ = 'season'
     id_season = db.Column(db.Integer, primary_key=True)
-    name_season = db.Column(db.String(30))
+    name_season = db.Column(db.String(30), index=True)
 
 class Chief(db.Model):
     __tablename__ = 'chief'
@@ -28,7 +28,7 @@ class Dish(db.Model):
     __tablename__ = 'dish'
     id_dish = db.Column(db.Integer, primary_key=True)
     name_dish = db.Column(db.String(30))
-    id_season = db.Column(db.Integer, db.ForeignKey('season.id_season'))
+    id_season = db.Column(db.Integer, db.ForeignKey('season.id_season'), index=True)
     id_country = db.Column(db.Integer, db.ForeignKey('country.id_country'))
     id_group = db.Column(db.Integer, db.ForeignKey('dish_type.id_group'))
     id_chief = db.Column(db.Integer, db.ForeignKey('chief.id_chief'))
@@ -47,6 +47,13 @@ class Human(db.Model):
 
 class DishRating(db.Model):
     __tablename__ = 'dish_rating'
+    __table_args__ = (
+        db.Index('ix_dish_rating_date_dish', 'date', 'id_dish', 'rate'),
+        # Одна оценка на пару (пользователь, блюдо): на этот индекс опирается upsert в update_dish_rating
+        db.Index('ux_dish_rating_user_dish', 'id_user', 'id_dish', unique=True),
+        # id не переиспользуются: строки с ними могут лежать в dish_rating_archive
+        {'sqlite_autoincrement': True},
+    )
     id_rate = db.Column(db.Integer, primary_key=True)
     id_user = db.Column(db.Integer, db.ForeignKey('human.id_user'))
     id_dish = db.Column(db.Integer, db.ForeignKey('dish.id_dish'))
@@ -54,6 +61,13 @@ class DishRating(db.Model):
     comment = db.Column(db.String(255))
     date = db.Column(db.Date)
 
+class DishRatingStats(db.Model):
+    # Агрегат оценок блюда, поддерживается приращениями при каждой записи в dish_rating
+    __tablename__ = 'dish_rating_stats'
+    id_dish = db.Column(db.Integer, db.ForeignKey('dish.id_dish'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+
 class Product(db.Model):
     __tablename__ = 'product'
     id_prod = db.Column(db.Integer, primary_key=True)
@@ -70,7 +84,66 @@ class Recipe(db.Model):
 
 class OrderOfDishes(db.Model):
     __tablename__ = 'order_of_dishes'
+    __table_args__ = (
+        db.Index('ix_order_of_dishes_date_dish', 'date', 'id_dish'),
+        {'sqlite_autoincrement': True},
+    )
     id_order = db.Column(db.Integer, primary_key=True)
     id_dish = db.Column(db.Integer, db.ForeignKey('dish.id_dish'))
     id_user = db.Column(db.Integer, db.ForeignKey('human.id_user'))
     date = db.Column(db.Date)
+
+class DishRatingArchive(db.Model):
+    # Холодная часть dish_rating: оценки старше отсечки, перенесённые archive_service
+    __tablename__ = 'dish_rating_archive'
+    __table_args__ = (
+        db.Index('ix_dish_rating_archive_date_dish', 'date', 'id_dish'),
+        db.Index('ix_dish_rating_archive_user_dish', 'id_user', 'id_dish'),
+    )
+    id_rate = db.Column(db.Integer, primary_key=True)
+    id_user = db.Column(db.Integer)
+    id_dish = db.Column(db.Integer)
+    rate = db.Column(db.Integer)
+    comment = db.Column(db.String(255))
+    date = db.Column(db.Date)
+
+class OrderOfDishesArchive(db.Model):
+    # Холодная часть order_of_dishes
+    __tablename__ = 'order_of_dishes_archive'
+    __table_args__ = (
+        db.Index('ix_order_of_dishes_archive_date_dish', 'date', 'id_dish'),
+    )
+    id_order = db.Column(db.Integer, primary_key=True)
+    id_dish = db.Column(db.Integer)
+    id_user = db.Column(db.Integer)
+    date = db.Column(db.Date)
+
+class ArchiveWatermark(db.Model):
+    # Все строки таблицы с датой раньше cutoff лежат в её архиве
+    __tablename__ = 'archive_watermark'
+    table_name = db.Column(db.String(64), primary_key=True)
+    cutoff = db.Column(db.Date, nullable=False)
+
+class ChangeLog(db.Model):
+    # Журнал изменений для инкрементальной синхронизации клиентов, пишется триггерами (см. change_service).
+    # AUTOINCREMENT: номера не переиспользуются и после сжатия журнала
+    __tablename__ = 'change_log'
+    __table_args__ = {'sqlite_autoincrement': True}
+    seq = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(64), nullable=False)
+    op = db.Column(db.String(6), nullable=False)
+    row_key = db.Column(db.String(255), nullable=False)
+    changed_at = db.Column(db.DateTime)
+
+class ChangeLogCompaction(db.Model):
+    # Граница сжатия журнала: записей с seq <= compacted_seq больше нет
+    __tablename__ = 'change_log_compaction'
+    id = db.Column(db.Integer, primary_key=True)
+    compacted_seq = db.Column(db.Integer, nullable=False)
+    compacted_at = db.Column(db.DateTime)
+
+class DishNeighbor(db.Model):
+    __tablename__ = 'dish_neighbor'
+    id_dish = db.Column(db.Integer, db.ForeignKey('dish.id_dish'), primary_key=True)
+    id_neighbor = db.Column(db.Integer, db.ForeignKey('dish.id_dish'), primary_key=True)
+    similarity = db.Column(db.Float)
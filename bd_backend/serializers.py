@@ -0,0 +1,192 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from itertools import islice
+from operator import attrgetter
+
+from flask import current_app, request, stream_with_context
+from sqlalchemy import select
+
+from models import db, Country, Season, Chief, DishType, Dish, Human, DishRating, Product, Recipe, OrderOfDishes
+
+try:
+    import orjson
+except ImportError:  # orjson не установлен — работаем на стандартном json
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps(data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+    def dumps(data):
+        return _encoder.encode(data).encode('utf-8')
+
+
+def json_response(data, status=200):
+    return current_app.response_class(dumps(data), status=status, mimetype='application/json')
+
+
+class QueryParamError(ValueError):
+    pass
+
+
+class FieldsError(QueryParamError):
+    pass
+
+
+def columnar(fields, rows):
+    # Транспонируем строки курсора в колонки без промежуточных dict на каждую строку
+    columns = zip(*rows) if rows else ((),) * len(fields)
+    return {'columns': list(fields), 'data': dict(zip(fields, columns))}
+
+
+def rows_response(fields, rows):
+    # ?format=columnar — {"columns": [...], "data": {"col": [...]}}, иначе массив объектов
+    response_format = request.args.get('format', 'records')
+    if response_format == 'columnar':
+        return json_response(columnar(fields, rows))
+    if response_format != 'records':
+        raise QueryParamError(f'Unknown format: {response_format}')
+    return json_response([dict(zip(fields, row)) for row in rows])
+
+
+CSV_CHUNK_ROWS = 1000
+
+
+def iter_csv(fields, rows, chunk_rows=CSV_CHUNK_ROWS):
+    # В памяти держим не больше одной пачки строк: пишем её в буфер и сразу отдаём клиенту
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            break
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    tail = buffer.getvalue()
+    if tail:
+        yield tail
+
+
+def csv_response(name, fields, rows):
+    return current_app.response_class(
+        stream_with_context(iter_csv(fields, rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={name}.csv'}
+    )
+
+
+def stream_rows(stmt):
+    # Серверный курсор: строки читаются из БД по мере отправки ответа
+    connection = db.session.connection().execution_options(stream_results=True, yield_per=CSV_CHUNK_ROWS)
+    return connection.execute(stmt)
+
+
+class ModelSerializer:
+    """Сериализатор модели: фиксированный порядок колонок -> кортеж -> dict."""
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = tuple(fields)
+        self._row = attrgetter(*self.fields)
+        self._subsets = {}
+
+    def row(self, obj):
+        values = self._row(obj)
+        return values if len(self.fields) > 1 else (values,)
+
+    def from_row(self, row):
+        return dict(zip(self.fields, row))
+
+    def one(self, obj):
+        return self.from_row(self.row(obj))
+
+    def many(self, objs):
+        fields = self.fields
+        row = self.row
+        return [dict(zip(fields, row(obj))) for obj in objs]
+
+    def only(self, fields):
+        fields = tuple(dict.fromkeys(fields))
+        if fields == self.fields:
+            return self
+        subset = self._subsets.get(fields)
+        if subset is None:
+            unknown = [field for field in fields if field not in self.fields]
+            if unknown:
+                raise FieldsError(f"Unknown fields: {', '.join(unknown)}")
+            subset = self._subsets[fields] = ModelSerializer(self.model, fields)
+        return subset
+
+    def for_request(self, default=None):
+        # ?fields=id_dish,name_dish — проекция попадает прямо в SELECT
+        fields = request.args.get('fields')
+        if not fields:
+            return self.only(default) if default else self
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        if not fields:
+            raise FieldsError('Parameter fields must list at least one field')
+        return self.only(fields)
+
+    @property
+    def columns(self):
+        table = self.model.__table__
+        return [table.c[field] for field in self.fields]
+
+    def select(self):
+        return select(*self.columns)
+
+    def fetch_rows(self, stmt=None):
+        # Чтение только нужных колонок через Core: без гидратации ORM-объектов и identity map
+        if stmt is None:
+            stmt = self.select()
+        return db.session.connection().execute(stmt).all()
+
+    def fetch(self, stmt=None):
+        fields = self.fields
+        return [dict(zip(fields, row)) for row in self.fetch_rows(stmt)]
+
+    def respond(self, stmt=None):
+        return rows_response(self.fields, self.fetch_rows(stmt))
+
+    def export_csv(self, name, stmt=None):
+        if stmt is None:
+            stmt = self.select()
+        return csv_response(name, self.fields, stream_rows(stmt))
+
+    def fetch_one(self, stmt):
+        row = db.session.connection().execute(stmt).first()
+        return None if row is None else self.from_row(row)
+
+    def fetch_by_pk(self, *ident):
+        stmt = self.select()
+        for column, value in zip(self.model.__table__.primary_key.columns, ident):
+            stmt = stmt.where(column == value)
+        return self.fetch_one(stmt)
+
+
+country_serializer = ModelSerializer(Country, ('id_country', 'name_country'))
+season_serializer = ModelSerializer(Season, ('id_season', 'name_season'))
+chief_serializer = ModelSerializer(Chief, ('id_chief', 'name_chief', 'id_country', 'exp_years'))
+dish_type_serializer = ModelSerializer(DishType, ('id_group', 'type'))
+dish_serializer = ModelSerializer(Dish, ('id_dish', 'name_dish', 'id_season', 'id_country', 'id_group', 'id_chief'))
+# password_hash наружу не отдаём никогда
+user_serializer = ModelSerializer(Human, ('id_user', 'name_user', 'email', 'age', 'id_country', 'sex', 'is_admin'))
+rating_serializer = ModelSerializer(DishRating, ('id_rate', 'id_user', 'id_dish', 'rate', 'comment', 'date'))
+product_serializer = ModelSerializer(Product, ('id_prod', 'name_product', 'calories', 'cost_product', 'id_season'))
+recipe_serializer = ModelSerializer(Recipe, ('id_dish', 'id_product', 'gramms'))
+order_serializer = ModelSerializer(OrderOfDishes, ('id_order', 'id_dish', 'id_user', 'date'))
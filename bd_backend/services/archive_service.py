@@ -0,0 +1,113 @@
+import json
+
+from sqlalchemy import func, select, union_all
+from models import db, ArchiveWatermark, ChangeLog, DishRating, DishRatingArchive, OrderOfDishes, OrderOfDishesArchive
+
+ARCHIVE_BATCH = 1000
+
+# Горячая таблица -> архив с теми же колонками. В горячей остаются только строки не старше отсечки
+ARCHIVES = {
+    OrderOfDishes: OrderOfDishesArchive,
+    DishRating: DishRatingArchive,
+}
+ARCHIVE_TABLES = tuple(archive.__tablename__ for archive in ARCHIVES.values())
+
+
+def archive_cutoff(model):
+    return db.session.query(ArchiveWatermark.cutoff).filter_by(table_name=model.__tablename__).scalar()
+
+
+def needs_archive(model, since=None):
+    cutoff = archive_cutoff(model)
+    return cutoff is not None and (since is None or since < cutoff)
+
+
+def partition(model, since=None):
+    """Строки модели с даты since (None — за всё время) как подзапрос с колонками горячей таблицы.
+
+    Если диапазон целиком позже отсечки, читается только горячая таблица, иначе — UNION ALL
+    горячей таблицы и архива. Условие на дату ставится в каждую ветку, чтобы работали индексы по date.
+    """
+    hot = model.__table__
+    branches = [select(hot)]
+    if needs_archive(model, since):
+        cold = ARCHIVES[model].__table__
+        branches.append(select(*(cold.c[column.name] for column in hot.c)))
+    if since is not None:
+        branches = [branch.where(branch.selected_columns.date >= since) for branch in branches]
+    if len(branches) == 1:
+        return hot if since is None else branches[0].subquery(hot.name)
+    return union_all(*branches).subquery(hot.name)
+
+
+def select_partitioned(model, fields, date_from=None, date_to=None):
+    source = partition(model, date_from)
+    stmt = select(*(source.c[field] for field in fields))
+    if date_to is not None:
+        stmt = stmt.where(source.c.date <= date_to)
+    return stmt
+
+
+def _raise_watermark(model, cutoff):
+    watermark = ArchiveWatermark.query.get(model.__tablename__)
+    if watermark is None:
+        db.session.add(ArchiveWatermark(table_name=model.__tablename__, cutoff=cutoff))
+    elif watermark.cutoff < cutoff:
+        watermark.cutoff = cutoff
+    db.session.commit()
+
+
+def archive_rows(model, cutoff, batch_size=ARCHIVE_BATCH):
+    """Переносит строки с датой раньше cutoff в архив пачками по batch_size, каждая пачка — своя транзакция.
+
+    Отсечка поднимается до переноса: пока он идёт, читатели старых дат уже смотрят в обе таблицы,
+    а каждая строка в любой момент лежит ровно в одной из них.
+    """
+    hot = model.__table__
+    cold = ARCHIVES[model].__table__
+    pk = hot.primary_key.columns.values()[0]
+    _raise_watermark(model, cutoff)
+    # id в архиве не пересекаются с новыми: горячие таблицы объявлены с AUTOINCREMENT
+    moved = 0
+    while True:
+        ids = [ident for ident, in db.session.query(pk).filter(hot.c.date < cutoff).order_by(pk).limit(batch_size)]
+        if not ids:
+            return moved
+        try:
+            db.session.execute(
+                cold.insert().from_select([column.name for column in hot.c], select(hot).where(pk.in_(ids)))
+            )
+            # Запись в БД уже за нами, поэтому всё, что триггеры добавят в журнал после mark, — наше
+            mark = db.session.query(func.max(ChangeLog.seq)).scalar() or 0
+            db.session.execute(hot.delete().where(pk.in_(ids)))
+            _forget_moved(hot, pk, ids, mark)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(ids)
+
+
+def _forget_moved(hot, pk, ids, mark):
+    # Перенос в архив — не удаление: строки по-прежнему видны в /api/orders и /api/ratings,
+    # поэтому записи об их удалении из журнала изменений убираем в той же транзакции
+    keys = [json.dumps({pk.name: ident}, separators=(',', ':')) for ident in ids]
+    ChangeLog.query.filter(
+        ChangeLog.seq > mark, ChangeLog.table_name == hot.name, ChangeLog.op == 'delete', ChangeLog.row_key.in_(keys)
+    ).delete(synchronize_session=False)
+
+
+def archive_before(cutoff, batch_size=ARCHIVE_BATCH):
+    return {model.__tablename__: archive_rows(model, cutoff, batch_size) for model in ARCHIVES}
+
+
+def take_archived_rating(user_id, dish_id):
+    # Повторная оценка пары, чья оценка уже в архиве: старую забираем из архива, чтобы пара
+    # оставалась единственной в обеих частях, а агрегат правился как при обновлении
+    row = db.session.query(DishRatingArchive.id_rate, DishRatingArchive.rate).filter_by(
+        id_user=user_id, id_dish=dish_id
+    ).first()
+    if row is None:
+        return None
+    DishRatingArchive.query.filter_by(id_rate=row.id_rate).delete(synchronize_session=False)
+    return row.rate
@@ -0,0 +1,102 @@
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+from models import db
+
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.005
+BACKUP_SUFFIX = '.db'
+
+
+def database_path():
+    return db.engine.url.database
+
+
+def backup_dir(app):
+    return app.config.get('BACKUP_DIR') or os.path.join(app.instance_path, 'backups')
+
+
+def _check(path):
+    connection = sqlite3.connect(path)
+    try:
+        result = connection.execute('PRAGMA quick_check').fetchone()[0]
+    finally:
+        connection.close()
+    if result != 'ok':
+        raise sqlite3.DatabaseError(f'Snapshot {path} is damaged: {result}')
+
+
+def backup_database(directory, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """Снимок БД без остановки приложения через online backup API SQLite.
+
+    Копирует по pages страниц за шаг и между шагами отпускает блокировку на pause секунд,
+    поэтому запись в базу ждёт не дольше одного шага. Снимок пишется во временный файл
+    и появляется в каталоге под своим именем только целиком (os.replace).
+    """
+    os.makedirs(directory, exist_ok=True)
+    name = datetime.now().strftime('snapshot-%Y%m%d-%H%M%S-%f') + BACKUP_SUFFIX
+    target = os.path.join(directory, name)
+    partial = target + '.part'
+    started = time.monotonic()
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if remaining:
+            time.sleep(pause)
+
+    source = sqlite3.connect(database_path())
+    destination = sqlite3.connect(partial)
+    try:
+        source.backup(destination, pages=pages, progress=progress)
+    except Exception:
+        destination.close()
+        os.remove(partial)
+        raise
+    finally:
+        source.close()
+    destination.close()
+    os.replace(partial, target)
+    return {
+        'name': name,
+        'size': os.path.getsize(target),
+        'steps': steps,
+        'seconds': round(time.monotonic() - started, 3)
+    }
+
+
+def list_backups(directory):
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(BACKUP_SUFFIX):
+            continue
+        stat = os.stat(os.path.join(directory, name))
+        backups.append({'name': name, 'size': stat.st_size, 'created_at': datetime.fromtimestamp(stat.st_mtime)})
+    return backups
+
+
+def restore_database(snapshot, target=None):
+    """Подменяет файл БД снимком: копия рядом с целевым файлом и атомарный os.replace.
+
+    Уже открытые соединения продолжают читать старый файл, поэтому работающее приложение
+    после восстановления нужно перезапустить. Копия проверяется PRAGMA quick_check до подмены.
+    """
+    target = target or database_path()
+    partial = target + '.restore'
+    shutil.copyfile(snapshot, partial)
+    try:
+        _check(partial)
+    except Exception:
+        os.remove(partial)
+        raise
+    os.replace(partial, target)
+    # Журнал отката от старого файла к новому не относится
+    if os.path.exists(target + '-journal'):
+        os.remove(target + '-journal')
+    return {'target': target, 'size': os.path.getsize(target)}
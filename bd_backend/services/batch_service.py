@@ -0,0 +1,168 @@
+import operator
+from datetime import date, datetime
+
+from sqlalchemy import Date, select
+from models import db, DishRating
+from serializers import (
+    country_serializer, dish_serializer, order_serializer, product_serializer, rating_serializer, user_serializer
+)
+from services.archive_service import ARCHIVES, partition
+from services.batching import chunks
+from services.delete_service import delete_many_with_policies, primary_key
+from services.rating_service import refresh_rating_stats
+from services.recommendation_service import recommendation_job
+
+# Сущности для массовых операций; изменять можно только поля сериализатора, кроме первичного ключа
+BATCH_ENTITIES = {
+    'orders': order_serializer,
+    'ratings': rating_serializer,
+    'users': user_serializer,
+    'dishes': dish_serializer,
+    'products': product_serializer,
+    'countries': country_serializer,
+}
+
+FILTER_OPS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'lte': operator.le,
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'in': lambda column, value: column.in_(value),
+    'is_null': lambda column, value: column.is_(None) if value else column.isnot(None),
+}
+
+
+class BatchError(ValueError):
+    pass
+
+
+def _column(serializer, field, source=None):
+    if field not in serializer.fields:
+        raise BatchError(f'Unknown field: {field}')
+    return (serializer.model.__table__ if source is None else source).c[field]
+
+
+def _coerce(column, value):
+    if isinstance(column.type, Date) and isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).date() if 'T' in value else date.fromisoformat(value)
+        except ValueError:
+            raise BatchError(f'Invalid date for {column.name}: {value}')
+    if isinstance(value, list):
+        return [_coerce(column, item) for item in value]
+    return value
+
+
+def _value(column, value):
+    # Значения для UPDATE проверяем по типу колонки до сравнений и записи: "5" в rate — ошибка запроса
+    value = _coerce(column, value)
+    if value is None:
+        return None
+    expected = column.type.python_type
+    if expected is float:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif expected is int:
+        valid = isinstance(value, int) and not isinstance(value, bool)
+    else:
+        valid = isinstance(value, expected)
+    if not valid:
+        raise BatchError(f'Invalid value for {column.name}: expected {expected.__name__}')
+    return value
+
+
+def _conditions(serializer, filters, source=None):
+    # {"поле": значение} — равенство, {"поле": {"gte": 1, "lt": 5}} — сравнения, {"поле": {"in": [...]}}
+    conditions = []
+    for field, spec in filters.items():
+        column = _column(serializer, field, source)
+        if not isinstance(spec, dict):
+            spec = {'eq': spec} if spec is not None else {'is_null': True}
+        for op, value in spec.items():
+            if op not in FILTER_OPS:
+                raise BatchError(f'Unknown filter operator: {op}')
+            conditions.append(FILTER_OPS[op](column, _coerce(column, value)))
+    return conditions
+
+
+def _selected_ids(serializer, ids, filters):
+    """Id записей из явного списка ids или по фильтру; читается только колонка первичного ключа."""
+    pk = primary_key(serializer.model)
+    if ids is not None:
+        if not isinstance(ids, list):
+            raise BatchError('ids must be a list')
+        try:
+            return list(dict.fromkeys(int(ident) for ident in ids))
+        except (TypeError, ValueError):
+            raise BatchError('ids must be integers')
+    if not filters or not isinstance(filters, dict):
+        raise BatchError('Either ids or a non-empty filter is required')
+    # Удалять можно и архивные заказы и оценки, поэтому фильтр смотрит в обе части таблицы
+    model = serializer.model
+    source = partition(model) if model in ARCHIVES else model.__table__
+    stmt = select(source.c[pk.name]).where(*_conditions(serializer, filters, source))
+    return [ident for ident, in db.session.execute(stmt)]
+
+
+def batch_delete(entity, ids=None, filters=None, dry_run=False):
+    serializer = BATCH_ENTITIES[entity]
+    try:
+        selected = _selected_ids(serializer, ids, filters)
+    except BatchError as e:
+        return {'success': False, 'invalid': True, 'message': str(e)}
+    return {'matched': len(selected), **delete_many_with_policies(serializer.model, selected, dry_run)}
+
+
+def _targets(serializer, ids, filters):
+    """Условия WHERE для выбранных записей: пачки pk IN (...) по явному списку ids или один фильтр.
+
+    Фильтр применяется прямо в UPDATE, без выборки id, которые потом пришлось бы повторять
+    в каждом запросе списком параметров.
+    """
+    if ids is not None:
+        selected = _selected_ids(serializer, ids, None)
+        pk = primary_key(serializer.model)
+        return len(selected), [(pk.in_(chunk),) for chunk in chunks(selected)]
+    if not filters or not isinstance(filters, dict):
+        raise BatchError('Either ids or a non-empty filter is required')
+    return None, [tuple(_conditions(serializer, filters))]
+
+
+def batch_update(entity, values, ids=None, filters=None):
+    serializer = BATCH_ENTITIES[entity]
+    model = serializer.model
+    pk = primary_key(model)
+    try:
+        if not values or not isinstance(values, dict):
+            raise BatchError('values must be a non-empty object')
+        if pk.name in values:
+            raise BatchError(f'Primary key {pk.name} cannot be updated')
+        values = {field: _value(_column(serializer, field), value) for field, value in values.items()}
+        matched, targets = _targets(serializer, ids, filters)
+    except BatchError as e:
+        return {'success': False, 'invalid': True, 'message': str(e)}
+    if model is DishRating and 'rate' in values and not 1 <= (values['rate'] or 0) <= 5:
+        return {'success': False, 'invalid': True, 'message': 'Rating must be between 1 and 5'}
+
+    # Оценки: запоминаем затронутые блюда, чтобы пересчитать агрегаты и соседей
+    touched = set()
+    updated = 0
+    try:
+        for conditions in targets:
+            if model is DishRating:
+                touched.update(
+                    id_dish for id_dish, in db.session.query(DishRating.id_dish).filter(*conditions).distinct()
+                )
+            updated += model.query.filter(*conditions).update(values, synchronize_session=False)
+        if model is DishRating and touched:
+            if 'id_dish' in values:
+                touched.add(values['id_dish'])
+            refresh_rating_stats(sorted(touched))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return {'success': False, 'message': str(e)}
+    for id_dish in touched:
+        recommendation_job.mark_dirty(id_dish)
+    return {'success': True, 'matched': updated if matched is None else matched, 'updated': updated}
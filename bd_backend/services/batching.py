@@ -0,0 +1,8 @@
+# SQLite ограничивает число параметров в запросе, поэтому длинные IN (...) режем на части
+SQL_CHUNK = 500
+
+
+def chunks(values, size=SQL_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from sqlalchemy import event
+
+# Счётчики версий таблиц: любая закоммиченная запись в таблицу увеличивает её версию,
+# и все закэшированные результаты, прочитанные из этой таблицы, становятся устаревшими.
+_table_versions = defaultdict(int)
+_versions_lock = threading.Lock()
+
+_MISSING = object()
+
+
+def bump_tables(*tables):
+    with _versions_lock:
+        for table in tables:
+            _table_versions[table] += 1
+
+
+def tables_version(tables):
+    return tuple(_table_versions[table] for table in tables)
+
+
+# Именованные кэши для статистики попаданий (/api/reports/cache_stats)
+_named_caches = {}
+
+
+class TTLCache:
+    """Кэш с TTL и версиями таблиц; при max_size вытесняет давно не читанные записи (LRU)."""
+
+    def __init__(self, ttl, tables, max_size=None, name=None):
+        self.ttl = ttl
+        self.tables = tuple(tables)
+        self.max_size = max_size
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if name is not None:
+            _named_caches[name] = self
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at, version = entry
+        if expires_at < time.monotonic() or version != tables_version(self.tables):
+            with self._lock:
+                self._entries.pop(key, None)
+            self.misses += 1
+            return default
+        if self.max_size is not None:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, version=None):
+        if version is None:
+            version = tables_version(self.tables)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, version)
+            self._entries.move_to_end(key)
+            if self.max_size is not None:
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        # Версию снимаем до вычисления: запись, пришедшая во время расчёта, сразу его инвалидирует
+        version = tables_version(self.tables)
+        value = compute()
+        self.set(key, value, version)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'ttl': self.ttl,
+            'tables': list(self.tables),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in sorted(_named_caches.items())}
+
+
+def _pending_tables(session):
+    return session.info.setdefault('pending_tables', set())
+
+
+def register_cache_invalidation(db):
+    @event.listens_for(db.session, 'after_flush')
+    def collect_flushed_tables(session, flush_context):
+        pending = _pending_tables(session)
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(obj, '__tablename__', None)
+            if table:
+                pending.add(table)
+
+    @event.listens_for(db.session, 'do_orm_execute')
+    def collect_bulk_tables(orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = getattr(orm_execute_state.statement, 'table', None)
+            if table is not None:
+                _pending_tables(orm_execute_state.session).add(table.name)
+
+    @event.listens_for(db.session, 'after_commit')
+    def invalidate_committed_tables(session):
+        pending = session.info.pop('pending_tables', None)
+        if pending:
+            bump_tables(*pending)
+
+    @event.listens_for(db.session, 'after_rollback')
+    def forget_rolled_back_tables(session):
+        session.info.pop('pending_tables', None)
@@ -0,0 +1,189 @@
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import DDL, event, func, select, tuple_
+from models import db, ChangeLog, ChangeLogCompaction
+from serializers import (
+    country_serializer, season_serializer, chief_serializer, dish_type_serializer, dish_serializer,
+    user_serializer, rating_serializer, product_serializer, recipe_serializer, order_serializer
+)
+from services.archive_service import ARCHIVES, partition
+from services.batching import chunks
+
+CHANGE_OPS = ('insert', 'update', 'delete')
+CHANGES_LIMIT = 1000
+CHANGES_MAX_LIMIT = 5000
+CHANGE_LOG_RETENTION_DAYS = 7
+
+# Таблицы, изменения которых видят клиенты; имена — как у списков и выгрузки в CSV
+CHANGE_FEEDS = {
+    'dishes': dish_serializer,
+    'countries': country_serializer,
+    'seasons': season_serializer,
+    'dishtypes': dish_type_serializer,
+    'chiefs': chief_serializer,
+    'users': user_serializer,
+    'ratings': rating_serializer,
+    'products': product_serializer,
+    'recipes': recipe_serializer,
+    'orders': order_serializer,
+}
+_FEED_BY_TABLE = {serializer.model.__tablename__: name for name, serializer in CHANGE_FEEDS.items()}
+
+
+def _trigger_ddl(table, op, feed_table=None):
+    # Триггер, а не события сессии: так в журнал попадают и массовые UPDATE/DELETE, и upsert через Core
+    feed_table = table if feed_table is None else feed_table
+    row = 'OLD' if op == 'delete' else 'NEW'
+    key = ', '.join(f"'{column.name}', {row}.{column.name}" for column in table.primary_key.columns)
+    return (
+        f'CREATE TRIGGER IF NOT EXISTS change_log_{table.name}_{op} AFTER {op.upper()} ON {table.name} '
+        f'BEGIN INSERT INTO change_log (table_name, op, row_key, changed_at) '
+        f"VALUES ('{feed_table.name}', '{op}', json_object({key}), CURRENT_TIMESTAMP); END"
+    )
+
+
+def _change_triggers():
+    for serializer in CHANGE_FEEDS.values():
+        for op in CHANGE_OPS:
+            yield serializer.model.__table__, _trigger_ddl(serializer.model.__table__, op)
+    # Архивные строки видны в лентах orders и ratings, поэтому их изменение (например, nullify при удалении
+    # блюда) и удаление пишутся под именем горячей таблицы. Вставка в архив — часть переноса, её в журнал не пишем
+    for model, archive in ARCHIVES.items():
+        for op in ('update', 'delete'):
+            yield archive.__table__, _trigger_ddl(archive.__table__, op, model.__table__)
+
+
+def install_change_triggers(connection):
+    for _, ddl in _change_triggers():
+        connection.exec_driver_sql(ddl)
+
+
+# Для таблиц, которые создаёт create_all (init_db.py), триггеры появляются вместе с таблицей
+for _table, _ddl in _change_triggers():
+    event.listen(_table, 'after_create', DDL(_ddl))
+
+
+def last_seq():
+    return max(db.session.query(func.max(ChangeLog.seq)).scalar() or 0, compacted_seq())
+
+
+def compacted_seq():
+    return db.session.query(func.max(ChangeLogCompaction.compacted_seq)).scalar() or 0
+
+
+def _primary_key(serializer):
+    return serializer.model.__table__.primary_key.columns
+
+
+def _key_values(serializer, key):
+    return tuple(key[column.name] for column in _primary_key(serializer))
+
+
+def _pk_key(serializer):
+    positions = [serializer.fields.index(column.name) for column in _primary_key(serializer)]
+    return lambda row: tuple(row[position] for position in positions)
+
+
+def _current_rows(serializer, keys):
+    # Текущее состояние изменённых строк; заказы и оценки могли уже уехать в архив
+    model = serializer.model
+    source = partition(model) if model in ARCHIVES else model.__table__
+    pk = [source.c[column.name] for column in _primary_key(serializer)]
+    column = pk[0] if len(pk) == 1 else tuple_(*pk)
+    row_key = _pk_key(serializer)
+    rows = {}
+    for chunk in chunks(keys):
+        values = [key[0] for key in chunk] if len(pk) == 1 else chunk
+        stmt = select(*(source.c[field] for field in serializer.fields)).where(column.in_(values))
+        for row in serializer.fetch_rows(stmt):
+            rows[row_key(row)] = serializer.from_row(row)
+    return rows
+
+
+def get_changes(since=0, feeds=None, limit=CHANGES_LIMIT):
+    """Изменения после seq since: по одной записи на строку — последняя операция и текущие данные.
+
+    Ответ ограничен limit записями; при has_more следующий запрос делается с since=seq из ответа.
+    Если since старше границы сжатия журнала или новее его конца (база восстановлена из снимка),
+    клиенту нужно перечитать таблицы целиком (resync), после чего продолжить с seq из ответа.
+    """
+    limit = max(1, min(limit, CHANGES_MAX_LIMIT))
+    # Верхнюю границу берём до чтения журнала: записи, закоммиченные позже, достанутся следующему запросу
+    head = last_seq()
+    floor = compacted_seq()
+    if since < floor or since > head:
+        # since больше последнего seq, если базу восстановили из снимка: журнал откатился вместе с данными
+        message = (
+            f'Changes up to seq {floor} were compacted, reload the tables' if since < floor
+            else f'Change log was rewound to seq {head}, reload the tables'
+        )
+        return {'success': False, 'resync': True, 'message': message, 'seq': head, 'compacted_seq': floor}
+    feeds = list(CHANGE_FEEDS) if feeds is None else feeds
+    tables = [CHANGE_FEEDS[name].model.__tablename__ for name in feeds]
+    latest = (
+        db.session.query(func.max(ChangeLog.seq).label('seq'))
+        .filter(ChangeLog.seq > since, ChangeLog.seq <= head, ChangeLog.table_name.in_(tables))
+        .group_by(ChangeLog.table_name, ChangeLog.row_key)
+        .subquery()
+    )
+    entries = (
+        db.session.query(ChangeLog.seq, ChangeLog.table_name, ChangeLog.op, ChangeLog.row_key, ChangeLog.changed_at)
+        .join(latest, latest.c.seq == ChangeLog.seq)
+        .order_by(ChangeLog.seq)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    keys = defaultdict(list)
+    for entry in entries:
+        if entry.op != 'delete':
+            serializer = CHANGE_FEEDS[_FEED_BY_TABLE[entry.table_name]]
+            keys[entry.table_name].append(_key_values(serializer, json.loads(entry.row_key)))
+    rows = {
+        table: _current_rows(CHANGE_FEEDS[_FEED_BY_TABLE[table]], table_keys)
+        for table, table_keys in keys.items()
+    }
+
+    changes = []
+    for entry in entries:
+        feed = _FEED_BY_TABLE[entry.table_name]
+        key = json.loads(entry.row_key)
+        row = None
+        if entry.op != 'delete':
+            row = rows[entry.table_name].get(_key_values(CHANGE_FEEDS[feed], key))
+        changes.append({
+            'seq': entry.seq,
+            'table': feed,
+            # Строки нет, хотя последняя запись — не удаление: её удалили в ещё не прочитанной части журнала
+            'op': entry.op if row is not None or entry.op == 'delete' else 'delete',
+            'key': key,
+            'row': row,
+            'changed_at': entry.changed_at
+        })
+    return {
+        'success': True,
+        'seq': entries[-1].seq if has_more else max(head, since),
+        'has_more': has_more,
+        'changes': changes
+    }
+
+
+def compact_changes(keep_days=CHANGE_LOG_RETENTION_DAYS):
+    """Удаляет записи журнала старше keep_days дней и запоминает границу сжатия."""
+    # changed_at пишет триггер через CURRENT_TIMESTAMP (UTC), поэтому и отсечку считает SQLite
+    cutoff = func.datetime('now', f'-{int(keep_days)} days')
+    seq = db.session.query(func.max(ChangeLog.seq)).filter(ChangeLog.changed_at < cutoff).scalar()
+    if seq is None:
+        return {'success': True, 'deleted': 0, 'compacted_seq': compacted_seq()}
+    try:
+        deleted = ChangeLog.query.filter(ChangeLog.seq <= seq).delete(synchronize_session=False)
+        db.session.add(ChangeLogCompaction(compacted_seq=seq, compacted_at=datetime.now()))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return {'success': False, 'message': str(e)}
+    return {'success': True, 'deleted': deleted, 'compacted_seq': seq}
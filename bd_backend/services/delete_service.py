@@ -0,0 +1,156 @@
+from collections import namedtuple
+
+from sqlalchemy import func, select
+from models import (
+    db, Country, Chief, Dish, Human, DishRating, DishRatingStats, Product, Recipe, OrderOfDishes, DishNeighbor,
+    DishRatingArchive, OrderOfDishesArchive
+)
+from services.archive_service import ARCHIVES
+from services.batching import chunks
+from services.recommendation_service import recommendation_job
+
+RESTRICT = 'restrict'
+CASCADE = 'cascade'
+NULLIFY = 'nullify'
+
+Relation = namedtuple('Relation', 'model column policy')
+
+# Что делать с зависимыми строками при удалении записи. Заказы не удаляем: по ним считается
+# выручка, поэтому ссылку на удалённое блюдо или пользователя обнуляем
+DELETE_POLICIES = {
+    Dish: (
+        Relation(Recipe, 'id_dish', CASCADE),
+        Relation(DishRating, 'id_dish', CASCADE),
+        Relation(DishRatingStats, 'id_dish', CASCADE),
+        Relation(DishNeighbor, 'id_dish', CASCADE),
+        Relation(DishNeighbor, 'id_neighbor', CASCADE),
+        Relation(OrderOfDishes, 'id_dish', NULLIFY),
+        Relation(DishRatingArchive, 'id_dish', CASCADE),
+        Relation(OrderOfDishesArchive, 'id_dish', NULLIFY),
+    ),
+    Product: (
+        # Молча менять состав блюд нельзя: сначала нужно убрать продукт из рецептов
+        Relation(Recipe, 'id_product', RESTRICT),
+    ),
+    Country: (
+        Relation(Chief, 'id_country', NULLIFY),
+        Relation(Dish, 'id_country', NULLIFY),
+        Relation(Human, 'id_country', NULLIFY),
+    ),
+    Human: (
+        Relation(DishRating, 'id_user', CASCADE),
+        Relation(OrderOfDishes, 'id_user', NULLIFY),
+        Relation(DishRatingArchive, 'id_user', CASCADE),
+        Relation(OrderOfDishesArchive, 'id_user', NULLIFY),
+    ),
+}
+
+
+def primary_key(model):
+    return model.__table__.primary_key.columns.values()[0]
+
+
+def _subtract_ratings(ratings, condition):
+    # Вычитаем удаляемые оценки из агрегатов блюд одним UPDATE с коррелированными подзапросами
+    rated = db.session.query(ratings.id_dish).filter(condition).distinct()
+    own = (condition, ratings.id_dish == DishRatingStats.id_dish)
+    dish_ids = [id_dish for id_dish, in rated]
+    DishRatingStats.query.filter(DishRatingStats.id_dish.in_(rated)).update(
+        {
+            DishRatingStats.rating_count: DishRatingStats.rating_count
+            - select(func.count(ratings.rate)).where(*own).scalar_subquery(),
+            DishRatingStats.rating_sum: DishRatingStats.rating_sum
+            - select(func.coalesce(func.sum(ratings.rate), 0)).where(*own).scalar_subquery()
+        },
+        synchronize_session=False
+    )
+    return dish_ids
+
+
+DELETE_HOOKS = {
+    # Архивные оценки тоже входят в агрегаты, поэтому при удалении пользователя вычитаем и их
+    Human: lambda ids: (
+        _subtract_ratings(DishRating, DishRating.id_user.in_(ids))
+        + _subtract_ratings(DishRatingArchive, DishRatingArchive.id_user.in_(ids))
+    ),
+    DishRating: lambda ids: _subtract_ratings(DishRating, DishRating.id_rate.in_(ids)),
+    DishRatingArchive: lambda ids: _subtract_ratings(DishRatingArchive, DishRatingArchive.id_rate.in_(ids)),
+}
+
+
+def _partitions(model):
+    # Заказы и оценки с тем же id могут лежать в архиве: списки отдают обе части, удаляем тоже из обеих
+    return (model, ARCHIVES[model]) if model in ARCHIVES else (model,)
+
+
+def _count(model, column, ids):
+    column = getattr(model, column) if isinstance(column, str) else column
+    return sum(
+        db.session.query(func.count()).select_from(model).filter(column.in_(chunk)).scalar()
+        for chunk in chunks(ids)
+    )
+
+
+def delete_many_with_policies(model, ids, dry_run=False):
+    """Удаляет записи по списку id и зависимые строки по DELETE_POLICIES одной транзакцией.
+
+    Каждая связь — DELETE/UPDATE ... WHERE fk IN (...) пачками по SQL_CHUNK id, строки в Python
+    не загружаются. При dry_run только считает затронутые строки.
+    """
+    ids = list(dict.fromkeys(ids))
+    partitions = _partitions(model)
+    relations = DELETE_POLICIES.get(model, ())
+    deleted = sum(_count(part, primary_key(part), ids) for part in partitions)
+    affected = [
+        {
+            'table': relation.model.__tablename__,
+            'column': relation.column,
+            'policy': relation.policy,
+            'rows': _count(relation.model, relation.column, ids)
+        }
+        for relation in relations
+    ]
+    blocked = [item for item in affected if item['policy'] == RESTRICT and item['rows']]
+    if blocked:
+        tables = ', '.join(f"{item['table']}.{item['column']}" for item in blocked)
+        return {
+            'success': False,
+            'message': f'Delete restricted by dependent rows in {tables}',
+            'restricted': True,
+            'deleted': 0,
+            'affected': affected
+        }
+    if dry_run:
+        return {'success': True, 'dry_run': True, 'deleted': deleted, 'affected': affected}
+
+    dirty = []
+    try:
+        for chunk in chunks(ids):
+            for part in partitions:
+                hook = DELETE_HOOKS.get(part)
+                if hook:
+                    dirty.extend(hook(chunk))
+            for relation in relations:
+                query = relation.model.query.filter(getattr(relation.model, relation.column).in_(chunk))
+                if relation.policy == CASCADE:
+                    query.delete(synchronize_session=False)
+                elif relation.policy == NULLIFY:
+                    query.update({relation.column: None}, synchronize_session=False)
+            for part in partitions:
+                part.query.filter(primary_key(part).in_(chunk)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return {'success': False, 'message': str(e), 'deleted': 0, 'affected': affected}
+    for id_dish in set(dirty):
+        recommendation_job.mark_dirty(id_dish)
+    return {'success': True, 'dry_run': False, 'deleted': deleted, 'affected': affected}
+
+
+def delete_with_policies(model, ident, dry_run=False):
+    if all(
+        db.session.query(primary_key(part)).filter(primary_key(part) == ident).first() is None
+        for part in _partitions(model)
+    ):
+        return {'success': False, 'not_found': True, 'message': 'Record not found'}
+    return delete_many_with_policies(model, [ident], dry_run)
@@ -1,23 +1,35 @@
-from models import db, Dish, Recipe, Season, Chief, Product
+import heapq
+from collections import defaultdict
+
+from sqlalchemy import func, update
+from models import db, Dish, Season, Chief
+from serializers import dish_serializer
+from services.cache_service import TTLCache
+from services.batching import chunks
+from services.nutrition_service import get_dish_nutrition
+
+# season приходит из URL как есть, поэтому число записей ограничено, лишние вытесняются по LRU
+_seasonal_cache = TTLCache(ttl=600, tables=('dish', 'season'), max_size=64, name='seasonal_dishes')
 
 
 def calculate_dish_cost(dish_id):
-    dish = Dish.query.get(dish_id)
-    if not dish:
-        return 0
-    total_cost = 0
-    for recipe in dish.recipes:
-        product = Product.query.get(recipe.id_product)
-        if product:
-            total_cost += (recipe.gramms / 1000) * product.cost_product
-    return round(total_cost, 2)
+    nutrition = get_dish_nutrition([dish_id])
+    return nutrition[0][1] if nutrition else 0
+
+
+def get_seasonal_dishes(season, serializer=dish_serializer):
+    # season — id или название сезона; результат кэшируется до записи в dish/season
+    key = (season, serializer.fields)
+    return _seasonal_cache.get_or_compute(key, lambda: _query_seasonal_dishes(season, serializer))
 
 
-def get_seasonal_dishes(season_name):
-    season = Season.query.filter_by(name_season=season_name).first()
-    if not season:
-        return []
-    return Dish.query.filter_by(id_season=season.id_season).all()
+def _query_seasonal_dishes(season, serializer):
+    stmt = serializer.select().join(Season, Season.id_season == Dish.id_season)
+    if season.isdigit():
+        stmt = stmt.where(Season.id_season == int(season))
+    else:
+        stmt = stmt.where(Season.name_season == season)
+    return serializer.fetch_rows(stmt)
 
 
 def change_dish_chef(dish_id, new_chef_id):
@@ -39,3 +51,103 @@ def change_dish_chef(dish_id, new_chef_id):
         'old_chef_id': old_chef_id,
         'new_chef_id': new_chef_id
     }
+
+
+def _chief_loads(target_ids):
+    # Текущая нагрузка целевых шефов — одним GROUP BY на пачку id
+    loads = dict.fromkeys(target_ids, 0)
+    for chunk in chunks(target_ids):
+        loads.update(
+            db.session.query(Dish.id_chief, func.count()).filter(Dish.id_chief.in_(chunk)).group_by(Dish.id_chief)
+        )
+    return loads
+
+
+def _plan_reassignment(dish_ids, target_ids):
+    # Каждое блюдо отдаём наименее загруженному шефу
+    loads = _chief_loads(target_ids)
+    heap = [(load, id_chief) for id_chief, load in loads.items()]
+    heapq.heapify(heap)
+    plan = {}
+    for id_dish in dish_ids:
+        load, id_chief = heapq.heappop(heap)
+        plan[id_dish] = id_chief
+        heapq.heappush(heap, (load + 1, id_chief))
+    return plan
+
+
+def _is_id_list(values):
+    return isinstance(values, list) and all(
+        isinstance(value, int) and not isinstance(value, bool) for value in values
+    )
+
+
+def reassign_chef_dishes(old_chef_id, new_chef_ids, dish_ids=None):
+    """Передаёт блюда шефа одному или нескольким шефам.
+
+    Если шефов несколько, блюда распределяются так, чтобы выровнять число блюд у каждого.
+    Запись — по одному UPDATE ... WHERE id_dish IN (...) на целевого шефа, всё в одной транзакции.
+    """
+    if not _is_id_list(new_chef_ids):
+        return {'success': False, 'message': 'chef_ids must be a list of integers'}
+    if dish_ids is not None and not _is_id_list(dish_ids):
+        return {'success': False, 'message': 'dish_ids must be a list of integers'}
+    new_chef_ids = list(dict.fromkeys(new_chef_ids))
+    if not new_chef_ids:
+        return {'success': False, 'message': 'At least one target chief is required'}
+    if old_chef_id in new_chef_ids:
+        return {'success': False, 'message': 'Target chiefs must differ from the source chief'}
+    known = {
+        id_chief for chunk in chunks([old_chef_id] + new_chef_ids)
+        for id_chief, in db.session.query(Chief.id_chief).filter(Chief.id_chief.in_(chunk))
+    }
+    if old_chef_id not in known:
+        return {'success': False, 'message': 'Chief not found'}
+    missing = [id_chief for id_chief in new_chef_ids if id_chief not in known]
+    if missing:
+        return {'success': False, 'message': f"Target chiefs not found: {', '.join(map(str, missing))}"}
+
+    query = db.session.query(Dish.id_dish).filter(Dish.id_chief == old_chef_id)
+    if dish_ids is None:
+        moving = [id_dish for id_dish, in query]
+    else:
+        moving = [
+            id_dish for chunk in chunks(dict.fromkeys(dish_ids))
+            for id_dish, in query.filter(Dish.id_dish.in_(chunk))
+        ]
+    moving.sort()
+    plan = _plan_reassignment(moving, new_chef_ids)
+
+    by_chef = defaultdict(list)
+    for id_dish, id_chief in plan.items():
+        by_chef[id_chief].append(id_dish)
+    # В ответ и журнал попадают только строки, которые UPDATE действительно изменил (RETURNING)
+    mapping = []
+    try:
+        for id_chief, ids in by_chef.items():
+            for chunk in chunks(ids):
+                # Условие на старого шефа защищает от блюд, которые успели переназначить параллельно
+                stmt = (
+                    update(Dish)
+                    .where(Dish.id_dish.in_(chunk), Dish.id_chief == old_chef_id)
+                    .values(id_chief=id_chief)
+                    .returning(Dish.id_dish)
+                )
+                mapping.extend(
+                    {'id_dish': id_dish, 'old_chef_id': old_chef_id, 'new_chef_id': id_chief}
+                    for id_dish, in db.session.execute(stmt)
+                )
+        # Нагрузку перечитываем после UPDATE, под той же блокировкой записи
+        loads = _chief_loads(new_chef_ids)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return {'success': False, 'message': str(e)}
+    mapping.sort(key=lambda item: item['id_dish'])
+    return {
+        'success': True,
+        'message': 'Dishes reassigned successfully',
+        'moved': len(mapping),
+        'mapping': mapping,
+        'loads': [{'id_chief': id_chief, 'dishes': load} for id_chief, load in loads.items()]
+    }
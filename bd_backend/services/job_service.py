@@ -0,0 +1,122 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models import db
+from services.cache_service import TTLCache, tables_version
+
+JOB_WORKERS = 4
+JOB_RESULT_TTL = 600
+# Сколько заданий может одновременно ждать в очереди или считаться
+JOB_MAX_PENDING = 32
+# Записей для переиспользования заданий на один отчёт: ключ — параметры запроса
+JOB_REUSE_SIZE = 256
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, report, fields):
+        self.id = uuid.uuid4().hex
+        self.report = report
+        self.fields = fields
+        self.status = 'queued'
+        self.created_at = datetime.now()
+        self.finished_at = None
+        self.expires_at = None
+        self.rows = None
+        self.error = None
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'report': self.report,
+            'status': self.status,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+        if self.status == 'done':
+            data['result'] = [dict(zip(self.fields, row)) for row in self.rows]
+        elif self.status == 'failed':
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """Фоновый расчёт отчётов в пуле потоков.
+
+    Готовый результат хранится ttl секунд. Повторный запрос того же отчёта с теми же параметрами
+    получает уже существующее задание, пока не истёк срок и не изменились таблицы, из которых
+    отчёт читается (те же счётчики версий, что у кэшей в cache_service).
+    """
+
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_RESULT_TTL, max_pending=JOB_MAX_PENDING):
+        self.workers = workers
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self._jobs = {}
+        self._by_params = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _results(self, report, tables):
+        cache = self._by_params.get(report)
+        if cache is None:
+            cache = self._by_params[report] = TTLCache(
+                ttl=self.ttl, tables=tables, max_size=JOB_REUSE_SIZE, name=f'jobs:{report}'
+            )
+        return cache
+
+    def _purge(self):
+        now = time.monotonic()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.expires_at and job.expires_at < now]:
+            del self._jobs[job_id]
+
+    def submit(self, app, report, fields, tables, compute, args):
+        """Возвращает (задание, было_ли_оно_уже_в_хранилище); JobQueueFull, если очередь заполнена."""
+        with self._lock:
+            self._purge()
+            results = self._results(report, tables)
+            job = results.get(args)
+            if job is not None and job.status != 'failed' and job.id in self._jobs:
+                return job, True
+            # Незавершённые задания не истекают по ttl, поэтому их число ограничиваем отдельно
+            pending = sum(1 for queued in self._jobs.values() if queued.expires_at is None)
+            if pending >= self.max_pending:
+                raise JobQueueFull(f'{self.max_pending} report jobs are already pending')
+            job = Job(report, fields)
+            self._jobs[job.id] = job
+            # Версию снимаем до расчёта: запись во время расчёта сделает результат устаревшим
+            results.set(args, job, tables_version(tables))
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='report-job')
+        self._executor.submit(self._run, app, job, compute, args)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def _run(self, app, job, compute, args):
+        job.status = 'running'
+        rows = error = None
+        with app.app_context():
+            try:
+                rows = [tuple(row) for row in compute(*args)]
+            except Exception as e:
+                app.logger.exception('Report job %s failed', job.id)
+                error = str(e)
+            finally:
+                db.session.remove()
+        job.rows, job.error = rows, error
+        job.finished_at = datetime.now()
+        job.expires_at = time.monotonic() + self.ttl
+        job.status = 'failed' if error is not None else 'done'
+
+
+report_jobs = JobManager()
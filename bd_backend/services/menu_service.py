@@ -0,0 +1,228 @@
+import time
+from bisect import insort
+from collections import defaultdict, namedtuple
+from itertools import accumulate
+
+from sqlalchemy import func
+from models import db, Dish, DishRatingStats, Product, Recipe
+from services.nutrition_service import get_dish_nutrition
+
+MENU_SEARCH_SECONDS = 2.0
+MENU_SEARCH_MAX_SECONDS = 10.0
+# Поиск — рекурсия на одно блюдо меню за уровень, поэтому размер меню ограничен
+MENU_MAX_SIZE = 100
+
+Candidate = namedtuple('Candidate', 'rating cost calories id_dish name_dish id_group id_chief')
+
+
+class _SearchTimeout(Exception):
+    pass
+
+
+def _season_candidates(season_id, min_calories, max_calories):
+    # Блюда сезона без единого продукта из другого сезона (id_season у продукта NULL — круглогодичный)
+    off_season = (
+        db.session.query(Recipe.id_dish)
+        .join(Product, Product.id_prod == Recipe.id_product)
+        .filter(Product.id_season.isnot(None), Product.id_season != season_id)
+    )
+    rating = DishRatingStats.rating_sum * 1.0 / func.nullif(DishRatingStats.rating_count, 0)
+    dishes = (
+        db.session.query(Dish.id_dish, Dish.name_dish, Dish.id_group, Dish.id_chief, rating.label('rating'))
+        .outerjoin(DishRatingStats, DishRatingStats.id_dish == Dish.id_dish)
+        .filter(Dish.id_season == season_id, Dish.id_dish.notin_(off_season))
+        .all()
+    )
+    nutrition = {id_dish: (cost, calories) for id_dish, cost, calories in get_dish_nutrition([d.id_dish for d in dishes])}
+    candidates = []
+    for d in dishes:
+        cost, calories = nutrition.get(d.id_dish, (0, 0))
+        if min_calories is not None and calories < min_calories:
+            continue
+        if max_calories is not None and calories > max_calories:
+            continue
+        candidates.append(Candidate(float(d.rating or 0), cost, calories, d.id_dish, d.name_dish, d.id_group, d.id_chief))
+    # Лучшие по рейтингу первыми: на этом держатся и жадное первое решение, и отсечения
+    candidates.sort(key=lambda c: (-c.rating, c.cost, c.id_dish))
+    return candidates
+
+
+def _greedy_menu(candidates, size, required_types, max_per_chief, penalty):
+    # Жадный отбор по рейтингу со штрафом за стоимость: сначала обязательные типы, затем остальное
+    ranked = sorted(candidates, key=lambda c: c.rating - penalty * c.cost, reverse=True)
+    picked = []
+    taken = set()
+    per_chief = defaultdict(int)
+    for wanted in (required_types, None):
+        covered = set()
+        for c in ranked:
+            if len(picked) == size:
+                break
+            if wanted is not None and (c.id_group not in wanted or c.id_group in covered):
+                continue
+            if c.id_dish in taken or (max_per_chief is not None and per_chief[c.id_chief] >= max_per_chief):
+                continue
+            picked.append(c)
+            taken.add(c.id_dish)
+            covered.add(c.id_group)
+            per_chief[c.id_chief] += 1
+    types = {c.id_group for c in picked}
+    if len(picked) < size or not required_types <= types:
+        return None
+    return picked
+
+
+def _initial_menu(candidates, size, max_cost, required_types, max_per_chief):
+    # Лагранжева эвристика: бинарным поиском подбираем штраф за стоимость, при котором укладываемся в бюджет
+    def fits(menu):
+        return menu is not None and (max_cost is None or sum(c.cost for c in menu) <= max_cost)
+
+    menu = _greedy_menu(candidates, size, required_types, max_per_chief, 0.0)
+    if fits(menu) or not candidates:
+        return menu if fits(menu) else None
+    max_rating = max(c.rating for c in candidates) or 1.0
+    low, high = 0.0, 1.0
+    best = None
+    for _ in range(40):
+        menu = _greedy_menu(candidates, size, required_types, max_per_chief, high)
+        if fits(menu):
+            best = menu
+            break
+        high *= 4
+        if high > 1e9 * max_rating:
+            return None
+    for _ in range(30):
+        middle = (low + high) / 2
+        menu = _greedy_menu(candidates, size, required_types, max_per_chief, middle)
+        if fits(menu):
+            best, high = menu, middle
+        else:
+            low = middle
+    return best
+
+
+def _search_menu(candidates, size, max_cost, required_types, max_per_chief, deadline):
+    n = len(candidates)
+    prefix = [0.0]
+    for c in candidates:
+        prefix.append(prefix[-1] + c.rating)
+    # cheapest[i][m] — сумма m самых дешёвых блюд среди candidates[i:]: нижняя оценка остатка бюджета
+    cheapest = [[0.0]] * (n + 1)
+    if max_cost is not None:
+        costs = []
+        for i in range(n - 1, -1, -1):
+            insort(costs, candidates[i].cost)
+            if len(costs) > size:
+                costs.pop()
+            cheapest[i] = [0.0] + list(accumulate(costs))
+    last_of_type = {}
+    for i, c in enumerate(candidates):
+        last_of_type[c.id_group] = i
+
+    best = {'score': -1.0, 'picked': None}
+    initial = _initial_menu(candidates, size, max_cost, required_types, max_per_chief)
+    if initial is not None:
+        best = {'score': sum(c.rating for c in initial), 'picked': initial}
+    picked = []
+    per_chief = defaultdict(int)
+    missing = {t: 1 for t in required_types}
+    nodes = [0]
+
+    def dfs(start, cost, score):
+        k = size - len(picked)
+        if k == 0:
+            if not missing and score > best['score']:
+                best['score'] = score
+                best['picked'] = list(picked)
+            return
+        if len(missing) > k:
+            return
+        nodes[0] += 1
+        if nodes[0] % 1024 == 0 and time.monotonic() > deadline:
+            raise _SearchTimeout
+        for j in range(start, n - k + 1):
+            # Верхняя оценка: k лучших из оставшихся; дальше по списку она только падает
+            if score + prefix[j + k] - prefix[j] <= best['score']:
+                return
+            if any(last_of_type.get(t, -1) < j for t in missing):
+                return
+            c = candidates[j]
+            if max_cost is not None and cost + c.cost + cheapest[j + 1][k - 1] > max_cost:
+                continue
+            if max_per_chief is not None and per_chief[c.id_chief] >= max_per_chief:
+                continue
+            picked.append(c)
+            per_chief[c.id_chief] += 1
+            covered = missing.pop(c.id_group, None)
+            dfs(j + 1, cost + c.cost, score + c.rating)
+            if covered:
+                missing[c.id_group] = covered
+            per_chief[c.id_chief] -= 1
+            picked.pop()
+
+    optimal = True
+    try:
+        dfs(0, 0.0, 0.0)
+    except _SearchTimeout:
+        optimal = False
+    return best['picked'], optimal
+
+
+def _is_number(value, integer=False):
+    return not isinstance(value, bool) and isinstance(value, int if integer else (int, float))
+
+
+def _invalid_input(season_id, size, max_cost, min_calories, max_calories, required_types, max_per_chief):
+    # Параметры приходят из JSON как есть: строка в size или max_cost — ошибка запроса, а не пустой результат
+    if not _is_number(season_id, integer=True):
+        return 'id_season must be an integer'
+    if not _is_number(size, integer=True) or not 1 <= size <= MENU_MAX_SIZE:
+        return f'Menu size must be an integer from 1 to {MENU_MAX_SIZE}'
+    for name, value in (('max_cost', max_cost), ('min_calories', min_calories), ('max_calories', max_calories)):
+        if value is not None and (not _is_number(value) or value < 0):
+            return f'{name} must be a non-negative number'
+    if max_per_chief is not None and (not _is_number(max_per_chief, integer=True) or max_per_chief < 1):
+        return 'max_per_chief must be a positive integer'
+    if required_types is not None and (
+        not isinstance(required_types, (list, tuple, set)) or not all(_is_number(t, integer=True) for t in required_types)
+    ):
+        return 'required_types must be a list of integers'
+    return None
+
+
+def optimize_menu(season_id, size, max_cost=None, min_calories=None, max_calories=None,
+                  required_types=(), max_per_chief=None, time_limit=MENU_SEARCH_SECONDS):
+    invalid = _invalid_input(season_id, size, max_cost, min_calories, max_calories, required_types, max_per_chief)
+    if invalid:
+        return {'success': False, 'message': invalid}
+    candidates = _season_candidates(season_id, min_calories, max_calories)
+    required_types = set(required_types or ())
+    if max_per_chief is not None and max_per_chief * len({c.id_chief for c in candidates}) < size:
+        return {'success': False, 'message': 'Not enough chiefs for the requested menu size', 'candidates': len(candidates)}
+    picked, optimal = _search_menu(
+        candidates, size, max_cost, required_types, max_per_chief, time.monotonic() + time_limit
+    )
+    if picked is None:
+        message = 'No menu satisfies the constraints'
+        if not optimal:
+            message += ' (search time limit reached)'
+        return {'success': False, 'message': message, 'candidates': len(candidates)}
+    return {
+        'success': True,
+        'optimal': optimal,
+        'candidates': len(candidates),
+        'total_cost': round(sum(c.cost for c in picked), 2),
+        'avg_rating': round(sum(c.rating for c in picked) / len(picked), 2),
+        'dishes': [
+            {
+                'id_dish': c.id_dish,
+                'name_dish': c.name_dish,
+                'id_group': c.id_group,
+                'id_chief': c.id_chief,
+                'cost': c.cost,
+                'calories': c.calories,
+                'avg_rating': round(c.rating, 2)
+            }
+            for c in picked
+        ]
+    }
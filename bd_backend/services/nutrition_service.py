@@ -0,0 +1,324 @@
+import threading
+from collections import defaultdict
+
+from models import db, Dish, Product, Recipe
+from services.batching import chunks
+from services.cache_service import tables_version
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy считаем теми же формулами на списках
+    np = None
+
+# cost_product — цена за 1000 г (как в calculate_dish_cost), calories — ккал на 100 г
+COST_GRAMS = 1000
+CALORIES_GRAMS = 100
+NUTRITION_FIELDS = ('id_dish', 'cost', 'calories')
+ENGINE_TABLES = ('dish', 'product', 'recipe')
+MAKEABLE_MAX_MISSING = 10
+
+
+def _zeros(n, dtype=float):
+    if np is not None:
+        return np.zeros(n, dtype=dtype)
+    return [dtype(0)] * n
+
+
+def _grow(array, size):
+    if len(array) >= size:
+        return array
+    new_size = max(size, 2 * len(array), 16)
+    if np is not None:
+        grown = np.zeros(new_size, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+    return array + [0] * (new_size - len(array))
+
+
+class NutritionEngine:
+    """Разреженная матрица блюдо x продукт (граммы в формате COO) и векторы цены/калорийности продуктов.
+
+    Стоимость и калорийность всех блюд считаются одним проходом по ненулевым элементам
+    (умножение матрицы на вектор), записи в recipe/product патчат матрицу на месте.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+
+    def load(self):
+        with self._lock:
+            version = tables_version(ENGINE_TABLES)
+            dish_ids = [row[0] for row in db.session.query(Dish.id_dish).order_by(Dish.id_dish)]
+            products = db.session.query(Product.id_prod, Product.cost_product, Product.calories).all()
+            recipes = db.session.query(Recipe.id_dish, Recipe.id_product, Recipe.gramms).all()
+
+            self._dish_row = {id_dish: i for i, id_dish in enumerate(dish_ids)}
+            self._dish_ids = dish_ids
+            self._product_col = {}
+            self._product_ids = []
+            self._cost = _zeros(len(products))
+            self._calories = _zeros(len(products))
+            for id_prod, cost, calories in products:
+                self._set_product(id_prod, cost, calories)
+
+            self._entry_pos = {}
+            self._product_entries = defaultdict(list)
+            self._dish_entries = defaultdict(list)
+            self._required = defaultdict(int)
+            self._removed = set()
+            self._size = 0
+            self._rows = _zeros(len(recipes), int)
+            self._cols = _zeros(len(recipes), int)
+            self._grams = _zeros(len(recipes))
+            for id_dish, id_prod, grams in recipes:
+                self._set_recipe(id_dish, id_prod, grams)
+
+            self._totals = None
+            self._version = version
+
+    def _ensure_loaded(self):
+        if self._version != tables_version(ENGINE_TABLES):
+            self.load()
+
+    def _dish(self, id_dish):
+        row = self._dish_row.get(id_dish)
+        if row is None:
+            row = self._dish_row[id_dish] = len(self._dish_ids)
+            self._dish_ids.append(id_dish)
+        return row
+
+    def _product(self, id_prod):
+        col = self._product_col.get(id_prod)
+        if col is None:
+            col = self._product_col[id_prod] = len(self._product_col)
+            self._product_ids.append(id_prod)
+            self._cost = _grow(self._cost, col + 1)
+            self._calories = _grow(self._calories, col + 1)
+        return col
+
+    def _set_product(self, id_prod, cost, calories):
+        col = self._product(id_prod)
+        self._cost[col] = cost or 0
+        self._calories[col] = calories or 0
+
+    def _set_recipe(self, id_dish, id_prod, grams):
+        key = (id_dish, id_prod)
+        pos = self._entry_pos.get(key)
+        if pos is None:
+            pos = self._entry_pos[key] = self._size
+            self._size += 1
+            self._rows = _grow(self._rows, self._size)
+            self._cols = _grow(self._cols, self._size)
+            self._grams = _grow(self._grams, self._size)
+            col = self._product(id_prod)
+            row = self._dish(id_dish)
+            self._rows[pos] = row
+            self._cols[pos] = col
+            self._product_entries[col].append(pos)
+            self._dish_entries[row].append(pos)
+            self._required[row] += 1
+        elif pos in self._removed:
+            self._removed.discard(pos)
+            self._required[self._rows[pos]] += 1
+        self._grams[pos] = grams or 0
+
+    def _patched(self, table):
+        # Патч вызывается после коммита одной записи в table. Если кроме неё версии таблиц
+        # ничего не сдвинуло, матрица актуальна; иначе пропущена чужая запись — перечитываем целиком
+        expected = list(self._version)
+        expected[ENGINE_TABLES.index(table)] += 1
+        current = tables_version(ENGINE_TABLES)
+        self._version = current if current == tuple(expected) else None
+        self._totals = None
+
+    def set_recipe(self, id_dish, id_prod, grams):
+        with self._lock:
+            if self._version is None:
+                return
+            self._set_recipe(id_dish, id_prod, grams)
+            self._patched('recipe')
+
+    def remove_recipe(self, id_dish, id_prod):
+        with self._lock:
+            if self._version is None:
+                return
+            pos = self._entry_pos.get((id_dish, id_prod))
+            if pos is not None and pos not in self._removed:
+                # Элемент остаётся в массивах с нулём граммов, но перестаёт считаться ингредиентом
+                self._grams[pos] = 0
+                self._removed.add(pos)
+                self._required[self._rows[pos]] -= 1
+            self._patched('recipe')
+
+    def set_product(self, id_prod, cost, calories):
+        with self._lock:
+            if self._version is None:
+                return
+            self._set_product(id_prod, cost, calories)
+            self._patched('product')
+
+    def remove_product(self, id_prod):
+        self.set_product(id_prod, 0, 0)
+
+    def _compute_totals(self):
+        n = len(self._dish_ids)
+        size = self._size
+        if np is not None:
+            rows = self._rows[:size]
+            cols = self._cols[:size]
+            grams = self._grams[:size]
+            cost = np.bincount(rows, weights=grams * self._cost[cols], minlength=n) / COST_GRAMS
+            calories = np.bincount(rows, weights=grams * self._calories[cols], minlength=n) / CALORIES_GRAMS
+            return cost.round(2).tolist(), calories.round(2).tolist()
+        cost = [0.0] * n
+        calories = [0.0] * n
+        for row, col, grams in zip(self._rows[:size], self._cols[:size], self._grams[:size]):
+            cost[row] += grams * self._cost[col]
+            calories[row] += grams * self._calories[col]
+        return (
+            [round(value / COST_GRAMS, 2) for value in cost],
+            [round(value / CALORIES_GRAMS, 2) for value in calories]
+        )
+
+    def nutrition(self, dish_ids=None):
+        with self._lock:
+            self._ensure_loaded()
+            if self._totals is None:
+                self._totals = self._compute_totals()
+            cost, calories = self._totals
+            if dish_ids is None:
+                return [(id_dish, cost[row], calories[row]) for row, id_dish in enumerate(self._dish_ids)]
+            rows = self._dish_row
+            return [(id_dish, cost[rows[id_dish]], calories[rows[id_dish]]) for id_dish in dish_ids if id_dish in rows]
+
+    def makeable(self, stock, max_missing=1):
+        """Блюда, которые можно приготовить из продуктов в наличии {id_prod: граммы или None}.
+
+        По обратному индексу продукт -> элементы матрицы считаем для каждого блюда число покрытых
+        ингредиентов; из блюд без общих с наличием продуктов добавляются только те, в которых
+        не больше max_missing ингредиентов.
+        Возвращает (готовые [id_dish], почти готовые [(id_dish, [(id_prod, нужно, не хватает)])]).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            covered = defaultdict(int)
+            for id_prod, available in stock.items():
+                col = self._product_col.get(id_prod)
+                if col is None:
+                    continue
+                for pos in self._product_entries[col]:
+                    if pos in self._removed:
+                        continue
+                    # Продукт есть, но граммов мало — блюдо всё равно кандидат в почти готовые
+                    covered[self._rows[pos]] += available is None or self._grams[pos] <= available
+            # Блюдо из не больше max_missing ингредиентов почти готово, даже если ни одного из них нет
+            for row, required in self._required.items():
+                if 0 < required <= max_missing and row not in covered:
+                    covered[row] = 0
+            ready = []
+            near = []
+            for row, count in covered.items():
+                missing = self._required[row] - count
+                if missing == 0:
+                    ready.append(self._dish_ids[row])
+                elif missing <= max_missing:
+                    near.append((self._dish_ids[row], self._missing(row, stock)))
+            ready.sort()
+            near.sort(key=lambda item: (len(item[1]), item[0]))
+            return ready, near
+
+    def _missing(self, row, stock):
+        missing = []
+        for pos in self._dish_entries[row]:
+            if pos in self._removed:
+                continue
+            id_prod = self._product_ids[self._cols[pos]]
+            needed = float(self._grams[pos])
+            available = stock.get(id_prod, 0)
+            if available is None or needed <= available:
+                continue
+            missing.append((id_prod, needed, needed - available))
+        return missing
+
+    def simulate_costs(self, new_costs):
+        """Стоимость блюд при гипотетических ценах продуктов {id_prod: cost}; матрица не меняется.
+
+        Затрагиваются только элементы матрицы изменённых продуктов (обратный индекс продукт -> блюда).
+        Возвращает [(id_dish, old_cost, new_cost)] для блюд, цена которых изменилась.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if self._totals is None:
+                self._totals = self._compute_totals()
+            delta = {}
+            for id_prod, cost in new_costs.items():
+                col = self._product_col.get(id_prod)
+                if col is not None and cost != self._cost[col]:
+                    delta[col] = cost - self._cost[col]
+            positions = [pos for col in delta for pos in self._product_entries[col]]
+            if np is not None:
+                positions = np.array(positions, dtype=int)
+                rows = self._rows[positions]
+                col_delta = np.zeros(len(self._cost))
+                col_delta[list(delta)] = list(delta.values())
+                weights = self._grams[positions] * col_delta[self._cols[positions]]
+                affected, inverse = np.unique(rows, return_inverse=True)
+                dish_delta = dict(zip(affected.tolist(), np.bincount(inverse, weights=weights).tolist()))
+            else:
+                dish_delta = defaultdict(float)
+                for pos in positions:
+                    dish_delta[self._rows[pos]] += self._grams[pos] * delta[self._cols[pos]]
+            old_cost = self._totals[0]
+            return [
+                (self._dish_ids[row], old_cost[row], round(old_cost[row] + value / COST_GRAMS, 2))
+                for row, value in dish_delta.items()
+                if value
+            ]
+
+
+nutrition_engine = NutritionEngine()
+
+
+def get_dish_nutrition(dish_ids=None):
+    return nutrition_engine.nutrition(dish_ids)
+
+
+def _parse_stock(products):
+    # Элемент списка — id продукта (количество не ограничено) или {"id_product": ..., "gramms": ...}
+    stock = {}
+    for item in products:
+        if isinstance(item, dict):
+            stock[int(item['id_product'])] = None if item.get('gramms') is None else float(item['gramms'])
+        else:
+            stock[int(item)] = None
+    return stock
+
+
+def get_makeable_dishes(products, max_missing=1):
+    try:
+        stock = _parse_stock(products)
+    except (KeyError, TypeError, ValueError):
+        return {'success': False, 'message': 'Products must be ids or objects with id_product and gramms'}
+    if isinstance(max_missing, bool) or not isinstance(max_missing, int) or not 0 <= max_missing <= MAKEABLE_MAX_MISSING:
+        return {'success': False, 'message': f'max_missing must be an integer from 0 to {MAKEABLE_MAX_MISSING}'}
+    ready, near = nutrition_engine.makeable(stock, max_missing)
+    names = {}
+    for chunk in chunks(ready + [id_dish for id_dish, _ in near]):
+        names.update(db.session.query(Dish.id_dish, Dish.name_dish).filter(Dish.id_dish.in_(chunk)))
+    return {
+        'success': True,
+        'makeable': [{'id_dish': id_dish, 'name_dish': names[id_dish]} for id_dish in ready if id_dish in names],
+        'near_misses': [
+            {
+                'id_dish': id_dish,
+                'name_dish': names[id_dish],
+                'missing': [
+                    {'id_product': id_prod, 'gramms': needed, 'shortage': shortage}
+                    for id_prod, needed, shortage in missing
+                ]
+            }
+            for id_dish, missing in near
+            if id_dish in names
+        ]
+    }
@@ -1,15 +1,106 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from flask import current_app
+from sqlalchemy import insert
 from models import db, OrderOfDishes
 from datetime import datetime
 
-def create_order(dish_id, user_id):
+ORDER_BATCH_SIZE = 200
+ORDER_BATCH_MS = 5
+ORDER_SUBMIT_TIMEOUT = 5.0
+
+
+def create_order(dish_id, user_id, date=None):
     try:
         order = OrderOfDishes(
             id_dish=dish_id,
             id_user=user_id,
-            date=datetime.now()
+            date=date or datetime.now()
         )
         db.session.add(order)
         db.session.commit()
         return {'success': True, 'message': 'Order created', 'order_id': order.id_order}
     except Exception as e:
         return {'success': False, 'message': str(e)}
+
+
+class OrderBatcher:
+    """Очередь заказов с групповым коммитом.
+
+    Один поток-писатель забирает из очереди до batch_size заказов (или всё, что пришло за batch_ms
+    после первого) и вставляет их одной транзакцией: один fsync на пачку вместо одного на заказ.
+    submit() возвращает ответ только после коммита пачки, поэтому подтверждённый заказ уже в БД.
+    При падении процесса теряются лишь заказы, по которым клиент ещё не получил ответа.
+    """
+
+    def __init__(self, batch_size=ORDER_BATCH_SIZE, batch_ms=ORDER_BATCH_MS):
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, app):
+        with self._lock:
+            if self._thread is None:
+                self.batch_size = app.config.get('ORDER_BATCH_SIZE', self.batch_size)
+                self.batch_ms = app.config.get('ORDER_BATCH_MS', self.batch_ms)
+                self._thread = threading.Thread(target=self._run, args=(app,), name='order-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, dish_id, user_id, timeout=ORDER_SUBMIT_TIMEOUT):
+        if self._thread is None:
+            self.start(current_app._get_current_object())
+        future = Future()
+        self._queue.put(({'id_dish': dish_id, 'id_user': user_id, 'date': datetime.now()}, future))
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Заказ может быть записан позже, клиенту стоит проверить его перед повтором
+            return {'success': False, 'message': 'Order queue timeout', 'timeout': True}
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_ms / 1000
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        stmt = insert(OrderOfDishes).returning(OrderOfDishes.id_order, sort_by_parameter_order=True)
+        try:
+            ids = db.session.execute(stmt, [values for values, _ in batch]).scalars().all()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Ошибка одного заказа не должна ронять всю пачку: записываем их по одному с датой приёма
+            for values, future in batch:
+                future.set_result(create_order(values['id_dish'], values['id_user'], values['date']))
+                db.session.rollback()
+            return
+        for (_, future), order_id in zip(batch, ids):
+            future.set_result({'success': True, 'message': 'Order created', 'order_id': order_id})
+
+    def _run(self, app):
+        while True:
+            batch = self._next_batch()
+            with app.app_context():
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    app.logger.exception('Order batch failed')
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_result({'success': False, 'message': str(e)})
+                finally:
+                    db.session.remove()
+
+
+order_batcher = OrderBatcher()
@@ -1,45 +1,129 @@
-from models import db, DishRating
+from models import db, Dish, DishRating, DishRatingStats
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from services.recommendation_service import recommendation_job
+from services.report_service import cached_report
+from services.batching import chunks
+from services.archive_service import ARCHIVE_TABLES, partition, take_archived_rating
 
+DISH_RATINGS_FIELDS = ('dish_id', 'dish_name', 'avg_rating', 'comments')
 
-def update_dish_rating(user_id, dish_id, rate, comment=None, id_rate=None):
+
+def adjust_rating_stats(id_dish, count_delta, sum_delta):
+    # Агрегат правим приращением в той же транзакции, что и саму оценку
+    stmt = insert(DishRatingStats).values(id_dish=id_dish, rating_count=count_delta, rating_sum=sum_delta)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[DishRatingStats.id_dish],
+        set_={
+            'rating_count': DishRatingStats.rating_count + stmt.excluded.rating_count,
+            'rating_sum': DishRatingStats.rating_sum + stmt.excluded.rating_sum
+        }
+    ))
+
+
+def _rating_totals(ratings):
+    # Агрегаты считаются по обеим частям: перенос оценки в архив не меняет средний рейтинг блюда
+    return (
+        db.session.query(ratings.c.id_dish, func.count(ratings.c.rate), func.sum(ratings.c.rate))
+        .filter(ratings.c.rate.isnot(None))
+        .group_by(ratings.c.id_dish)
+    )
+
+
+def rebuild_rating_stats():
+    DishRatingStats.query.delete(synchronize_session=False)
+    db.session.execute(DishRatingStats.__table__.insert().from_select(
+        ['id_dish', 'rating_count', 'rating_sum'],
+        _rating_totals(partition(DishRating))
+    ))
+
+
+def refresh_rating_stats(dish_ids):
+    # Пересчёт агрегатов выбранных блюд после массового изменения оценок
+    ratings = partition(DishRating)
+    for chunk in chunks(dish_ids):
+        DishRatingStats.query.filter(DishRatingStats.id_dish.in_(chunk)).delete(synchronize_session=False)
+        db.session.execute(DishRatingStats.__table__.insert().from_select(
+            ['id_dish', 'rating_count', 'rating_sum'],
+            _rating_totals(ratings).filter(ratings.c.id_dish.in_(chunk))
+        ))
+
+
+def collapse_duplicate_ratings():
+    # Из повторных оценок пары (пользователь, блюдо) оставляем последнюю, остальные удаляем одним запросом
+    # Строки с NULL в паре уникальный индекс не ограничивает, их не трогаем: GROUP BY слил бы их в одну группу
+    paired = (DishRating.id_user.isnot(None), DishRating.id_dish.isnot(None))
+    latest = db.session.query(func.max(DishRating.id_rate)).filter(*paired).group_by(
+        DishRating.id_user, DishRating.id_dish
+    )
+    return DishRating.query.filter(*paired, DishRating.id_rate.notin_(latest)).delete(synchronize_session=False)
+
+
+def _begin_write():
+    # pysqlite открывает транзакцию только на первом DML, и SELECT до него читает без блокировки.
+    # Старую оценку читаем уже под блокировкой записи, иначе две одновременные первые оценки
+    # пары обе увидят old_rate=None и дважды прибавят к агрегату
+    connection = db.session.connection()
+    if not connection.connection.dbapi_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+def update_dish_rating(user_id, dish_id, rate, comment=None):
     if rate < 1 or rate > 5:
         return {'success': False, 'message': 'Rating must be between 1 and 5'}
 
     try:
-        if id_rate:
-            rating = DishRating(
-                id_rate=id_rate,
-                id_user=user_id,
-                id_dish=dish_id,
-                rate=rate,
-                comment=comment,
-                date=datetime.now()
-            )
-        else:
-            rating = DishRating(
-                id_user=user_id,
-                id_dish=dish_id,
-                rate=rate,
-                comment=comment,
-                date=datetime.now()
-            )
-
-        db.session.add(rating)
+        _begin_write()
+        old_rate = db.session.query(DishRating.rate).filter_by(id_user=user_id, id_dish=dish_id).scalar()
+        if old_rate is None:
+            old_rate = take_archived_rating(user_id, dish_id)
+        stmt = insert(DishRating).values(
+            id_user=user_id,
+            id_dish=dish_id,
+            rate=rate,
+            comment=comment,
+            date=datetime.now()
+        )
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[DishRating.id_user, DishRating.id_dish],
+            set_={
+                'rate': stmt.excluded.rate,
+                'comment': func.coalesce(stmt.excluded.comment, DishRating.comment),
+                'date': stmt.excluded.date
+            }
+        ))
+        if old_rate is None:
+            adjust_rating_stats(dish_id, 1, rate)
+        elif old_rate != rate:
+            adjust_rating_stats(dish_id, 0, rate - old_rate)
         db.session.commit()
-        return {'success': True, 'message': 'Rating added successfully'}
+        recommendation_job.mark_dirty(dish_id)
+        if old_rate is None:
+            return {'success': True, 'message': 'Rating added successfully'}
+        return {'success': True, 'message': 'Rating updated successfully'}
     except Exception as e:
+        db.session.rollback()
         return {'success': False, 'message': str(e)}
 
 
+def dish_ratings_query(min_rating=3):
+    ratings = partition(DishRating)
+    avg_rating = func.avg(ratings.c.rate)
+    return (
+        db.session.query(
+            Dish.id_dish,
+            Dish.name_dish,
+            func.round(avg_rating, 2),
+            func.group_concat(ratings.c.comment, '; ')
+        )
+        .join(ratings, ratings.c.id_dish == Dish.id_dish)
+        .group_by(Dish.id_dish, Dish.name_dish)
+        .having(avg_rating >= min_rating)
+        .order_by(avg_rating.desc(), Dish.id_dish)
+    )
+
+
+@cached_report('dish_ratings', ('dish', 'dish_rating') + ARCHIVE_TABLES)
 def get_dish_ratings(min_rating=3):
-    # Здесь должна быть реализация вашей SQL-процедуры
-    # Возвращаем пример данных
-    return [
-        {
-            'dish_id': 1,
-            'dish_name': 'Sample Dish',
-            'avg_rating': 4.5,
-            'comments': 'Excellent; Very tasty'
-        }
-    ]
+    return [tuple(row) for row in dish_ratings_query(min_rating)]
@@ -0,0 +1,262 @@
+import heapq
+import math
+import threading
+from collections import defaultdict
+
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from models import db, Dish, DishNeighbor, DishRating
+from services.batching import chunks
+from services.report_service import get_top_dishes
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # без SciPy полная пересборка идёт через инвертированный индекс на dict
+    np = None
+    sparse = None
+
+NEIGHBORS_K = 20
+REFRESH_SECONDS = 30
+BUILD_BLOCK_DISHES = 512
+RECOMMENDATIONS_MAX_N = 100
+RECOMMENDATION_FIELDS = ('id_dish', 'name_dish', 'score', 'predicted_rating')
+
+
+def _ratings_query():
+    # Повторные оценки пользователя одного блюда усредняем
+    return (
+        db.session.query(
+            DishRating.id_user.label('id_user'),
+            DishRating.id_dish.label('id_dish'),
+            func.avg(DishRating.rate).label('rate')
+        )
+        .group_by(DishRating.id_user, DishRating.id_dish)
+    )
+
+
+def _top_k(scores, k):
+    return heapq.nlargest(k, ((sim, id_neighbor) for id_neighbor, sim in scores.items() if sim > 0))
+
+
+def _build_sparse(ratings, k):
+    dish_ids = sorted({id_dish for _, id_dish, _ in ratings})
+    user_ids = sorted({id_user for id_user, _, _ in ratings})
+    dish_index = {id_dish: i for i, id_dish in enumerate(dish_ids)}
+    user_index = {id_user: i for i, id_user in enumerate(user_ids)}
+    matrix = sparse.csr_matrix(
+        (
+            np.fromiter((float(rate) for _, _, rate in ratings), dtype=float, count=len(ratings)),
+            (
+                np.fromiter((dish_index[id_dish] for _, id_dish, _ in ratings), dtype=np.int64, count=len(ratings)),
+                np.fromiter((user_index[id_user] for id_user, _, _ in ratings), dtype=np.int64, count=len(ratings))
+            )
+        ),
+        shape=(len(dish_ids), len(user_ids))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = sparse.diags(1.0 / norms) @ matrix
+    transposed = normalized.T.tocsr()
+    dish_array = np.array(dish_ids)
+    neighbors = {}
+    # Косинусы считаем блоками строк, чтобы не держать в памяти всю матрицу dish x dish
+    for start in range(0, len(dish_ids), BUILD_BLOCK_DISHES):
+        block = (normalized[start:start + BUILD_BLOCK_DISHES] @ transposed).toarray()
+        block[np.arange(block.shape[0]), np.arange(start, start + block.shape[0])] = 0
+        kth = min(k, block.shape[1]) - 1
+        top = np.argpartition(-block, kth, axis=1)[:, :kth + 1]
+        for row, cols in enumerate(top):
+            sims = block[row, cols]
+            order = np.argsort(-sims)
+            neighbors[dish_ids[start + row]] = [
+                (float(sims[i]), int(dish_array[cols[i]])) for i in order if sims[i] > 0
+            ]
+    return neighbors
+
+
+def _build_python(ratings, k):
+    by_dish = defaultdict(dict)
+    by_user = defaultdict(dict)
+    for id_user, id_dish, rate in ratings:
+        by_dish[id_dish][id_user] = rate
+        by_user[id_user][id_dish] = rate
+    norms = {id_dish: math.sqrt(sum(r * r for r in users.values())) for id_dish, users in by_dish.items()}
+    neighbors = {}
+    for id_dish, users in by_dish.items():
+        dots = defaultdict(float)
+        for id_user, rate in users.items():
+            for other, other_rate in by_user[id_user].items():
+                if other != id_dish:
+                    dots[other] += rate * other_rate
+        norm = norms[id_dish]
+        neighbors[id_dish] = _top_k({other: dot / (norm * norms[other]) for other, dot in dots.items()}, k)
+    return neighbors
+
+
+def _write_neighbors(neighbors):
+    for chunk in chunks(neighbors):
+        DishNeighbor.query.filter(DishNeighbor.id_dish.in_(chunk)).delete(synchronize_session=False)
+    rows = [
+        {'id_dish': id_dish, 'id_neighbor': id_neighbor, 'similarity': sim}
+        for id_dish, items in neighbors.items()
+        for sim, id_neighbor in items
+    ]
+    if rows:
+        db.session.execute(DishNeighbor.__table__.insert(), rows)
+
+
+def rebuild_neighbors(k=NEIGHBORS_K):
+    ratings = _ratings_query().all()
+    neighbors = _build_sparse(ratings, k) if sparse is not None else _build_python(ratings, k)
+    DishNeighbor.query.delete(synchronize_session=False)
+    _write_neighbors(neighbors)
+    db.session.commit()
+    return len(neighbors)
+
+
+def _co_rating_similarities(dish_ids):
+    # Скалярные произведения по общим оценкам считаем в SQL только для изменившихся блюд
+    ratings = _ratings_query().subquery()
+    other = aliased(ratings)
+    dots = (
+        db.session.query(ratings.c.id_dish, other.c.id_dish, func.sum(ratings.c.rate * other.c.rate))
+        .join(other, (other.c.id_user == ratings.c.id_user) & (other.c.id_dish != ratings.c.id_dish))
+        .filter(ratings.c.id_dish.in_(dish_ids))
+        .group_by(ratings.c.id_dish, other.c.id_dish)
+        .all()
+    )
+    norms = {
+        id_dish: math.sqrt(total)
+        for id_dish, total in db.session.query(ratings.c.id_dish, func.sum(ratings.c.rate * ratings.c.rate))
+        .group_by(ratings.c.id_dish)
+        if total
+    }
+    sims = defaultdict(dict)
+    for id_dish, id_other, dot in dots:
+        sims[id_dish][id_other] = dot / (norms[id_dish] * norms[id_other])
+    return sims
+
+
+def refresh_neighbors(dish_ids, k=NEIGHBORS_K):
+    """Инкрементальное обновление: списки изменившихся блюд пересчитываются целиком,
+    а в списках их соседей обновляется только ребро к изменившемуся блюду."""
+    dish_ids = set(dish_ids)
+    sims = {}
+    for chunk in chunks(dish_ids):
+        sims.update(_co_rating_similarities(chunk))
+
+    neighbors = {id_dish: _top_k(sims.get(id_dish, {}), k) for id_dish in dish_ids}
+
+    # Обратные рёбра: блюда, у которых изменившееся блюдо есть в списке или может туда попасть
+    affected = defaultdict(dict)
+    for id_dish in dish_ids:
+        for other, sim in sims.get(id_dish, {}).items():
+            if other not in dish_ids:
+                affected[other][id_dish] = sim
+    for chunk in chunks(dish_ids):
+        for id_other, id_dish in db.session.query(DishNeighbor.id_dish, DishNeighbor.id_neighbor).filter(
+                DishNeighbor.id_neighbor.in_(chunk), DishNeighbor.id_dish.notin_(dish_ids)):
+            affected[id_other].setdefault(id_dish, 0.0)
+
+    for chunk in chunks(affected):
+        current = defaultdict(dict)
+        for id_other, id_neighbor, sim in db.session.query(
+                DishNeighbor.id_dish, DishNeighbor.id_neighbor, DishNeighbor.similarity).filter(
+                DishNeighbor.id_dish.in_(chunk)):
+            current[id_other][id_neighbor] = sim
+        for id_other in chunk:
+            merged = current[id_other]
+            merged.update(affected[id_other])
+            top = _top_k(merged, k)
+            if top != _top_k(current[id_other], k) or len(merged) != len(current[id_other]):
+                neighbors[id_other] = top
+
+    _write_neighbors(neighbors)
+    db.session.commit()
+    return len(neighbors)
+
+
+def get_recommendations(user_id, n=10):
+    mine = db.session.query(DishRating.id_dish).filter(DishRating.id_user == user_id)
+    score = func.sum(DishNeighbor.similarity * DishRating.rate)
+    weight = func.sum(DishNeighbor.similarity)
+    rows = (
+        db.session.query(DishNeighbor.id_neighbor, Dish.name_dish, score, score / weight)
+        .join(DishRating, DishRating.id_dish == DishNeighbor.id_dish)
+        .join(Dish, Dish.id_dish == DishNeighbor.id_neighbor)
+        .filter(DishRating.id_user == user_id, DishNeighbor.id_neighbor.notin_(mine))
+        .group_by(DishNeighbor.id_neighbor, Dish.name_dish)
+        .order_by(score.desc(), DishNeighbor.id_neighbor)
+        .limit(n)
+        .all()
+    )
+    if rows:
+        return [(id_dish, name, round(s, 3), round(predicted, 2)) for id_dish, name, s, predicted in rows]
+    # Холодный старт: пользователь ещё ничего не оценивал — отдаём лучшие по рейтингу
+    return [(id_dish, name, None, value) for id_dish, name, value, _ in get_top_dishes('rating', 'all', n)]
+
+
+class RecommendationJob:
+    """Фоновый поток: копит изменившиеся блюда и периодически пересчитывает их соседей."""
+
+    def __init__(self, interval=REFRESH_SECONDS):
+        self.interval = interval
+        self._dirty = set()
+        self._rebuild = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def mark_dirty(self, id_dish):
+        with self._lock:
+            self._dirty.add(id_dish)
+
+    def request_rebuild(self):
+        with self._lock:
+            self._rebuild = True
+        self._wakeup.set()
+
+    def start(self, app):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='recommendations', daemon=True)
+        if not db.session.query(DishNeighbor.id_dish).first():
+            self.request_rebuild()
+        self._thread.start()
+
+    def run_once(self):
+        with self._lock:
+            rebuild, dirty = self._rebuild, self._dirty
+            self._rebuild, self._dirty = False, set()
+        try:
+            if rebuild:
+                return rebuild_neighbors()
+            if dirty:
+                return refresh_neighbors(dirty)
+            return 0
+        except Exception:
+            # Несделанную работу возвращаем в очередь, иначе соседи этих блюд устареют до полной пересборки
+            with self._lock:
+                self._rebuild = self._rebuild or rebuild
+                self._dirty |= dirty
+            raise
+
+    def _run(self, app):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    self.run_once()
+                except Exception:
+                    app.logger.exception('Recommendation refresh failed')
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+recommendation_job = RecommendationJob()
@@ -0,0 +1,182 @@
+import inspect
+from datetime import date, timedelta
+from functools import wraps
+from sqlalchemy import case, func
+from models import db, Dish, DishRating, DishRatingStats, OrderOfDishes, Product, Recipe
+from services.archive_service import ARCHIVE_TABLES, partition
+from services.cache_service import TTLCache, tables_version
+
+TOP_METRICS = ('orders', 'rating', 'revenue')
+TOP_WINDOWS = {'7d': 7, '30d': 30, 'all': None}
+TOP_MAX_N = 100
+TOP_DISHES_FIELDS = ('id_dish', 'name_dish', 'value', 'count')
+SEASON_CONSISTENCY_FIELDS = (
+    'id_dish', 'name_dish', 'id_season', 'gramms', 'off_season_gramms', 'off_season_gramms_share',
+    'cost', 'off_season_cost', 'off_season_cost_share'
+)
+
+REPORT_CACHE_TTL = 300
+REPORT_CACHE_SIZE = 256
+
+_top_dishes_cache = TTLCache(
+    ttl=REPORT_CACHE_TTL,
+    tables=('dish', 'dish_rating', 'dish_rating_stats', 'order_of_dishes', 'recipe', 'product') + ARCHIVE_TABLES,
+    max_size=REPORT_CACHE_SIZE, name='top_dishes'
+)
+
+
+def _normalize(value):
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_normalize(item) for item in value)
+    return value
+
+
+def cached_report(name, tables, ttl=REPORT_CACHE_TTL, max_size=REPORT_CACHE_SIZE):
+    """Кэширует результат отчёта по нормализованным параметрам вызова.
+
+    Позиционные и именованные аргументы приводятся к одному ключу (с подставленными значениями
+    по умолчанию), поэтому f(3) и f(min_rating=3) попадают в одну запись.
+    """
+    cache = TTLCache(ttl=ttl, tables=tables, max_size=max_size, name=name)
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = tuple((param, _normalize(value)) for param, value in bound.arguments.items())
+            return cache.get_or_compute(key, lambda: fn(*args, **kwargs))
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+def _window_start(window):
+    days = TOP_WINDOWS[window]
+    if days is None:
+        return None
+    return date.today() - timedelta(days=days)
+
+
+def _dish_costs_subquery():
+    return (
+        db.session.query(
+            Recipe.id_dish.label('id_dish'),
+            func.sum(Recipe.gramms * Product.cost_product / 1000.0).label('cost')
+        )
+        .join(Product, Product.id_prod == Recipe.id_product)
+        .group_by(Recipe.id_dish)
+        .subquery()
+    )
+
+
+def _query_top_dishes(by, window, n):
+    since = _window_start(window)
+
+    if by == 'rating' and since is None:
+        # За всё время средний рейтинг уже посчитан в dish_rating_stats
+        agg = db.session.query(
+            DishRatingStats.id_dish.label('id_dish'),
+            (DishRatingStats.rating_sum * 1.0 / DishRatingStats.rating_count).label('value'),
+            DishRatingStats.rating_count.label('count')
+        ).filter(DishRatingStats.rating_count > 0).subquery()
+        value = agg.c.value
+    elif by == 'rating':
+        # Короткое окно читает только горячую часть, если отсечка архива раньше его начала
+        ratings = partition(DishRating, since)
+        agg = db.session.query(
+            ratings.c.id_dish.label('id_dish'),
+            func.avg(ratings.c.rate).label('value'),
+            func.count().label('count')
+        ).group_by(ratings.c.id_dish).subquery()
+        value = agg.c.value
+    else:
+        orders = partition(OrderOfDishes, since)
+        agg = db.session.query(
+            orders.c.id_dish.label('id_dish'),
+            func.count().label('count')
+        ).group_by(orders.c.id_dish).subquery()
+        value = agg.c.count
+
+    query = (
+        db.session.query(Dish.id_dish, Dish.name_dish, agg.c.count)
+        .join(agg, agg.c.id_dish == Dish.id_dish)
+    )
+    if by == 'revenue':
+        costs = _dish_costs_subquery()
+        value = agg.c.count * func.coalesce(costs.c.cost, 0)
+        query = query.outerjoin(costs, costs.c.id_dish == Dish.id_dish)
+    rows = (
+        query.add_columns(value.label('value'))
+        .order_by(value.desc(), Dish.id_dish)
+        .limit(n)
+        .all()
+    )
+    return [
+        (r.id_dish, r.name_dish, round(float(r.value), 2) if by != 'orders' else r.value, r.count)
+        for r in rows
+    ]
+
+
+def get_top_dishes(by='orders', window='all', n=10):
+    n = max(1, min(n, TOP_MAX_N))
+    key = (by, window)
+    cached = _top_dishes_cache.get(key)
+    # Кэшируем рейтинг на пару (метрика, окно); более короткие топы получаем срезом
+    if cached is not None:
+        limit, rows = cached
+        if n <= limit or len(rows) < limit:
+            return rows[:n]
+    version = tables_version(_top_dishes_cache.tables)
+    rows = _query_top_dishes(by, window, n)
+    _top_dishes_cache.set(key, (n, rows), version)
+    return rows
+
+
+def _share(part, total):
+    return round(part / total, 4) if total else 0.0
+
+
+@cached_report('season_consistency', ('dish', 'recipe', 'product'))
+def _query_season_consistency(season_id):
+    # Продукт не по сезону, если у него задан сезон и он не совпадает с сезоном блюда
+    # (id_season продукта NULL — круглогодичный; блюдо без сезона зависит от любого сезонного продукта)
+    off_season = Product.id_season.isnot(None) & (
+        Dish.id_season.is_(None) | (Product.id_season != Dish.id_season)
+    )
+    gramms = func.coalesce(Recipe.gramms, 0)
+    cost = gramms * func.coalesce(Product.cost_product, 0) / 1000.0
+    total_gramms = func.sum(gramms)
+    total_cost = func.sum(cost)
+    off_gramms = func.sum(case((off_season, gramms), else_=0))
+    off_cost = func.sum(case((off_season, cost), else_=0.0))
+    query = (
+        db.session.query(Dish.id_dish, Dish.name_dish, Dish.id_season, total_gramms, off_gramms, total_cost, off_cost)
+        .join(Recipe, Recipe.id_dish == Dish.id_dish)
+        .join(Product, Product.id_prod == Recipe.id_product)
+        .group_by(Dish.id_dish, Dish.name_dish, Dish.id_season)
+        .order_by((off_cost * 1.0 / func.nullif(total_cost, 0)).desc(), off_gramms.desc(), Dish.id_dish)
+    )
+    if season_id is not None:
+        query = query.filter(Dish.id_season == season_id)
+    return [
+        (
+            id_dish, name_dish, id_season,
+            grams, off_grams, _share(off_grams, grams),
+            round(dish_cost, 2), round(dish_off_cost, 2), _share(dish_off_cost, dish_cost)
+        )
+        for id_dish, name_dish, id_season, grams, off_grams, dish_cost, dish_off_cost in query
+    ]
+
+
+def get_season_consistency(season_id=None, min_share=0.0):
+    """Доля граммов и стоимости каждого блюда, приходящаяся на продукты не его сезона.
+
+    Считается одним GROUP BY по dish JOIN recipe JOIN product для всего каталога или одного сезона.
+    """
+    rows = _query_season_consistency(season_id)
+    if min_share:
+        rows = [row for row in rows if max(row[5], row[8]) >= min_share]
+    return rows
@@ -0,0 +1,118 @@
+from sqlalchemy import inspect, func
+from sqlalchemy.schema import CreateIndex, CreateTable
+from models import db, DishRating, DishRatingArchive, DishRatingStats
+from services.archive_service import ARCHIVES
+from services.rating_service import collapse_duplicate_ratings, rebuild_rating_stats
+from services.change_service import install_change_triggers
+
+
+def _migrate_ratings(existing, inspector):
+    # Уникальный индекс (id_user, id_dish) не создать, пока в таблице есть повторные оценки
+    if 'dish_rating' not in existing:
+        return []
+    indexes = {index['name'] for index in inspector.get_indexes('dish_rating')}
+    done = []
+    if 'ux_dish_rating_user_dish' not in indexes:
+        collapse_duplicate_ratings()
+        done.append('dish_rating: повторные оценки свёрнуты')
+    # Таблицу агрегатов мог уже создать create_all при импорте app, поэтому смотрим, заполнена ли она
+    rated = any(db.session.query(model.id_rate).first() for model in (DishRating, DishRatingArchive))
+    if 'ux_dish_rating_user_dish' not in indexes or rated and not db.session.query(DishRatingStats.id_dish).first():
+        rebuild_rating_stats()
+        done.append('dish_rating_stats: агрегаты пересчитаны')
+    db.session.commit()
+    return done
+
+
+def _migrate_autoincrement(existing):
+    # Горячие таблицы с архивом должны быть AUTOINCREMENT, иначе после удаления строки с наибольшим id
+    # SQLite выдаст его снова и он совпадёт с архивным. Пересоздаём таблицу одной транзакцией
+    done = []
+    for model, archive in ARCHIVES.items():
+        table = model.__table__
+        if table.name not in existing:
+            continue
+        with db.engine.connect() as connection:
+            sql = connection.exec_driver_sql(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table.name,)
+            ).scalar()
+            archive_pk = archive.__table__.primary_key.columns.values()[0]
+            archived_max = connection.execute(func.max(archive_pk).select()).scalar()
+        if 'AUTOINCREMENT' in sql.upper():
+            continue
+        columns = ', '.join(column.name for column in table.c)
+        raw = db.engine.raw_connection()
+        cursor = raw.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute(f'ALTER TABLE {table.name} RENAME TO {table.name}_old')
+            for index in table.indexes:
+                cursor.execute(f'DROP INDEX IF EXISTS {index.name}')
+            cursor.execute(str(CreateTable(table).compile(db.engine)))
+            for index in table.indexes:
+                cursor.execute(str(CreateIndex(index).compile(db.engine)))
+            cursor.execute(f'INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old')
+            cursor.execute(f'DROP TABLE {table.name}_old')
+            # Счётчик не ниже id, уже ушедших в архив
+            cursor.execute(
+                'UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?', (archived_max or 0, table.name)
+            )
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? WHERE NOT EXISTS '
+                '(SELECT 1 FROM sqlite_sequence WHERE name = ?)', (table.name, archived_max or 0, table.name)
+            )
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            raw.close()
+        done.append(f'{table.name}: таблица пересоздана с AUTOINCREMENT')
+    return done
+
+
+def _create_indexes(existing, unique):
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for index in table.indexes:
+            if index.unique == unique:
+                index.create(db.engine, checkfirst=True)
+
+
+def ensure_schema():
+    # create_all не трогает уже существующие таблицы, поэтому индексы,
+    # объявленные в моделях позже, досоздаём для них отдельно.
+    # Таблицы, добавленные в модели после init_db.py, создаём только в уже инициализированной БД.
+    # Здесь только идемпотентные CREATE ... IF NOT EXISTS: выполняется при каждом импорте app.
+    # Уникальные индексы могут требовать чистки данных, их и прочие миграции делает migrate.py
+    inspector = inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    if not existing:
+        return
+    db.create_all()
+    _create_indexes(existing, unique=False)
+    # Триггеры журнала изменений для таблиц, созданных до его появления
+    with db.engine.begin() as connection:
+        install_change_triggers(connection)
+
+
+def migrate_schema():
+    """Разовые миграции данных для БД, созданной старой версией приложения; повторный запуск ничего не меняет.
+
+    Сворачивает повторные оценки и создаёт уникальные индексы, пересчитывает агрегаты оценок,
+    пересоздаёт горячие таблицы с AUTOINCREMENT. Возвращает список выполненных шагов.
+    """
+    inspector = inspect(db.engine)
+    existing = set(inspector.get_table_names())
+    if not existing:
+        return []
+    db.create_all()
+    done = _migrate_ratings(existing, inspector)
+    done += _migrate_autoincrement(existing)
+    _create_indexes(existing, unique=False)
+    _create_indexes(existing, unique=True)
+    # Пересозданные таблицы теряют триггеры вместе со старой копией
+    with db.engine.begin() as connection:
+        install_change_triggers(connection)
+    return done
@@ -0,0 +1,150 @@
+import random
+import threading
+from collections import defaultdict
+
+from models import db, Dish, Recipe
+from services.batching import chunks
+from services.cache_service import tables_version
+
+try:
+    import numpy as np
+except ImportError:  # без NumPy сигнатуры считаем на списках
+    np = None
+
+# 32 полосы по 4 строки: пара блюд с Жаккаром 0.5 попадает в общую корзину с вероятностью ~0.87,
+# с Жаккаром 0.2 — ~0.05
+MINHASH_BANDS = 32
+MINHASH_ROWS = 4
+MINHASH_PERMUTATIONS = MINHASH_BANDS * MINHASH_ROWS
+MINHASH_PRIME = (1 << 31) - 1
+SIMILAR_FIELDS = ('id_dish', 'name_dish', 'similarity', 'common_products')
+SIMILARITY_TABLES = ('recipe',)
+
+_rng = random.Random(20240601)
+_A = [_rng.randrange(1, MINHASH_PRIME) for _ in range(MINHASH_PERMUTATIONS)]
+_B = [_rng.randrange(0, MINHASH_PRIME) for _ in range(MINHASH_PERMUTATIONS)]
+if np is not None:
+    _A_ARRAY = np.array(_A, dtype=np.int64)
+    _B_ARRAY = np.array(_B, dtype=np.int64)
+
+
+def minhash(products):
+    """MinHash-сигнатура множества id продуктов: минимум (a*x + b) mod p по каждой перестановке."""
+    if np is not None:
+        x = np.fromiter(products, dtype=np.int64, count=len(products))
+        return tuple(((np.outer(x, _A_ARRAY) + _B_ARRAY) % MINHASH_PRIME).min(axis=0).tolist())
+    return tuple(min((a * x + b) % MINHASH_PRIME for x in products) for a, b in zip(_A, _B))
+
+
+def _bands(signature):
+    for band in range(MINHASH_BANDS):
+        start = band * MINHASH_ROWS
+        yield band, signature[start:start + MINHASH_ROWS]
+
+
+class SimilarityIndex:
+    """LSH-индекс блюд по составу продуктов.
+
+    Для каждого блюда хранится множество продуктов и MinHash-сигнатура, разбитая на полосы;
+    блюда с совпавшей полосой лежат в одной корзине. Поиск похожих — объединение корзин блюда
+    и точный Жаккар только по этим кандидатам. Записи в recipe пересчитывают сигнатуру одного блюда.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._version = None
+
+    def load(self):
+        with self._lock:
+            version = tables_version(SIMILARITY_TABLES)
+            products = defaultdict(set)
+            for id_dish, id_product in db.session.query(Recipe.id_dish, Recipe.id_product):
+                products[id_dish].add(id_product)
+            self._products = {}
+            self._signatures = {}
+            self._buckets = [defaultdict(set) for _ in range(MINHASH_BANDS)]
+            for id_dish, items in products.items():
+                self._index(id_dish, items)
+            self._version = version
+
+    def _ensure_loaded(self):
+        if self._version != tables_version(SIMILARITY_TABLES):
+            self.load()
+
+    def _unindex(self, id_dish):
+        signature = self._signatures.pop(id_dish, None)
+        self._products.pop(id_dish, None)
+        if signature is None:
+            return
+        for band, key in _bands(signature):
+            bucket = self._buckets[band][key]
+            bucket.discard(id_dish)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def _index(self, id_dish, products):
+        self._unindex(id_dish)
+        if not products:
+            return
+        signature = minhash(products)
+        self._products[id_dish] = frozenset(products)
+        self._signatures[id_dish] = signature
+        for band, key in _bands(signature):
+            self._buckets[band][key].add(id_dish)
+
+    def _patched(self):
+        # Та же проверка, что в NutritionEngine: версия recipe сдвинулась ровно на нашу запись
+        current = tables_version(SIMILARITY_TABLES)
+        self._version = current if current == (self._version[0] + 1,) else None
+
+    def set_recipe(self, id_dish, id_product):
+        with self._lock:
+            if self._version is None:
+                return
+            if id_product not in self._products.get(id_dish, ()):
+                self._index(id_dish, self._products.get(id_dish, frozenset()) | {id_product})
+            self._patched()
+
+    def remove_recipe(self, id_dish, id_product):
+        with self._lock:
+            if self._version is None:
+                return
+            if id_product in self._products.get(id_dish, ()):
+                self._index(id_dish, self._products[id_dish] - {id_product})
+            self._patched()
+
+    def similar(self, id_dish, min_similarity=0.0):
+        with self._lock:
+            self._ensure_loaded()
+            signature = self._signatures.get(id_dish)
+            if signature is None:
+                return []
+            candidates = set()
+            for band, key in _bands(signature):
+                candidates |= self._buckets[band][key]
+            candidates.discard(id_dish)
+            products = self._products[id_dish]
+            scored = []
+            for other in candidates:
+                common = len(products & self._products[other])
+                similarity = common / len(products | self._products[other])
+                if similarity > min_similarity:
+                    scored.append((similarity, common, other))
+        scored.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return scored
+
+
+similarity_index = SimilarityIndex()
+
+
+def get_similar_dishes(id_dish, n=10, min_similarity=0.0):
+    scored = similarity_index.similar(id_dish, min_similarity)
+    names = {}
+    for chunk in chunks(other for _, _, other in scored):
+        names.update(db.session.query(Dish.id_dish, Dish.name_dish).filter(Dish.id_dish.in_(chunk)))
+    # Удалённые блюда с оставшимися рецептами пропускаем
+    return [
+        (other, names[other], round(similarity, 3), common)
+        for similarity, common, other in scored
+        if other in names
+    ][:n]
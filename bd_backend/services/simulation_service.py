@@ -0,0 +1,74 @@
+from datetime import date, timedelta
+from sqlalchemy import func
+from models import db, Dish, OrderOfDishes, Product
+from services.archive_service import partition
+from services.nutrition_service import nutrition_engine
+
+SIMULATION_FIELDS = ('id_dish', 'name_dish', 'old_cost', 'new_cost', 'delta', 'orders', 'revenue_delta')
+SIMULATION_MAX_WINDOW_DAYS = 365
+
+
+def _number(change, key):
+    value = change[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f'{key} must be a number')
+    return value
+
+
+def _resolve_costs(changes):
+    # Правило: какие продукты (product_ids / id_season / all) и как меняем цену (percent / delta / cost_product)
+    products = db.session.query(Product.id_prod, Product.cost_product, Product.id_season).all()
+    new_costs = {id_prod: cost or 0 for id_prod, cost, _ in products}
+    for change in changes:
+        if 'product_ids' in change:
+            ids = set(change['product_ids'])
+            selected = [id_prod for id_prod, _, _ in products if id_prod in ids]
+        elif 'id_season' in change:
+            selected = [id_prod for id_prod, _, id_season in products if id_season == change['id_season']]
+        elif change.get('all'):
+            selected = [id_prod for id_prod, _, _ in products]
+        else:
+            raise ValueError('Each change needs product_ids, id_season or all')
+        for id_prod in selected:
+            if 'percent' in change:
+                new_costs[id_prod] = new_costs[id_prod] * (1 + _number(change, 'percent') / 100)
+            elif 'delta' in change:
+                new_costs[id_prod] = new_costs[id_prod] + _number(change, 'delta')
+            elif 'cost_product' in change:
+                new_costs[id_prod] = _number(change, 'cost_product')
+            else:
+                raise ValueError('Each change needs percent, delta or cost_product')
+    return new_costs
+
+
+def simulate_pricing(changes, window_days=30):
+    valid_window = isinstance(window_days, int) and not isinstance(window_days, bool)
+    if not valid_window or not 1 <= window_days <= SIMULATION_MAX_WINDOW_DAYS:
+        return {'success': False, 'message': f'window_days must be an integer from 1 to {SIMULATION_MAX_WINDOW_DAYS}'}
+    if not isinstance(changes, list) or not changes or not all(isinstance(change, dict) for change in changes):
+        return {'success': False, 'message': 'changes must be a non-empty list of rules'}
+    try:
+        new_costs = _resolve_costs(changes)
+        dishes = nutrition_engine.simulate_costs(new_costs)
+    except (ValueError, TypeError, KeyError) as e:
+        return {'success': False, 'message': str(e)}
+    since = date.today() - timedelta(days=window_days)
+    recent = partition(OrderOfDishes, since)
+    orders = dict(db.session.query(recent.c.id_dish, func.count()).group_by(recent.c.id_dish).all())
+    names = dict(db.session.query(Dish.id_dish, Dish.name_dish).all()) if dishes else {}
+
+    rows = []
+    total_delta = 0
+    for id_dish, old_cost, new_cost in dishes:
+        delta = round(new_cost - old_cost, 2)
+        volume = orders.get(id_dish, 0)
+        total_delta += delta * volume
+        rows.append((id_dish, names.get(id_dish), old_cost, new_cost, delta, volume, round(delta * volume, 2)))
+    rows.sort(key=lambda row: -abs(row[6]))
+    return {
+        'success': True,
+        'window_days': window_days,
+        'affected_dishes': len(rows),
+        'revenue_delta': round(total_delta, 2),
+        'dishes': [dict(zip(SIMULATION_FIELDS, row)) for row in rows]
+    }
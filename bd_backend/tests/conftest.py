@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+# Модули приложения импортируются как верхнеуровневые (from models import ...), как при запуске app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Временная БД вместо instance/test.db: URI читается при импорте app, поэтому задаём его заранее
+_db_dir = tempfile.mkdtemp(prefix='bd_backend_tests_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+
+from app import app as flask_app  # noqa: E402
+from models import db, Chief, Country, Dish, Human, Product, Recipe  # noqa: E402
+from services.cache_service import bump_tables  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        # Кэши и движки в памяти переживают пересоздание таблиц, поэтому сбрасываем их версии
+        bump_tables(*db.metadata.tables)
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def catalog(app):
+    """Два блюда, продукт в рецепте первого, шеф и пользователь из одной страны."""
+    country = Country(name_country='Россия')
+    db.session.add(country)
+    db.session.flush()
+    chief = Chief(name_chief='Иван', id_country=country.id_country)
+    user = Human(name_user='Пётр', email='petr@example.com', id_country=country.id_country, age=date(1990, 1, 1))
+    product = Product(name_product='Свёкла', calories=40, cost_product=100)
+    spare = Product(name_product='Соль', calories=0, cost_product=20)
+    db.session.add_all([chief, user, product, spare])
+    db.session.flush()
+    borsch = Dish(name_dish='Борщ', id_country=country.id_country, id_chief=chief.id_chief)
+    salad = Dish(name_dish='Винегрет', id_country=country.id_country, id_chief=chief.id_chief)
+    db.session.add_all([borsch, salad])
+    db.session.flush()
+    db.session.add(Recipe(id_dish=borsch.id_dish, id_product=product.id_prod, gramms=200))
+    db.session.commit()
+    return {
+        'country': country.id_country, 'chief': chief.id_chief, 'user': user.id_user,
+        'product': product.id_prod, 'spare': spare.id_prod, 'borsch': borsch.id_dish, 'salad': salad.id_dish
+    }
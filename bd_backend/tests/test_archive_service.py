@@ -0,0 +1,130 @@
+from datetime import date
+
+from sqlalchemy import func, select
+from models import db, Dish, DishRating, DishRatingArchive, DishRatingStats, OrderOfDishes, OrderOfDishesArchive
+from services.archive_service import archive_before, partition
+from services.batch_service import batch_delete
+from services.delete_service import delete_with_policies
+from services.rating_service import rebuild_rating_stats
+from services.schema_service import migrate_schema
+
+OLD = date(2023, 1, 1)
+NEW = date(2024, 6, 1)
+CUTOFF = date(2024, 1, 1)
+
+
+def _seed(catalog):
+    db.session.add_all([
+        DishRating(id_user=catalog['user'], id_dish=catalog['borsch'], rate=2, date=OLD),
+        DishRating(id_user=catalog['user'], id_dish=catalog['salad'], rate=5, date=NEW),
+        OrderOfDishes(id_dish=catalog['borsch'], id_user=catalog['user'], date=OLD),
+        OrderOfDishes(id_dish=catalog['borsch'], id_user=catalog['user'], date=OLD),
+        OrderOfDishes(id_dish=catalog['salad'], id_user=catalog['user'], date=NEW),
+    ])
+    rebuild_rating_stats()
+    db.session.commit()
+
+
+def _stats(id_dish):
+    stats = db.session.get(DishRatingStats, id_dish)
+    return stats.rating_count, stats.rating_sum
+
+
+def test_archive_moves_old_rows_and_keeps_them_visible(catalog):
+    _seed(catalog)
+
+    assert archive_before(CUTOFF) == {'order_of_dishes': 2, 'dish_rating': 1}
+
+    assert OrderOfDishes.query.count() == 1
+    assert OrderOfDishesArchive.query.count() == 2
+    assert DishRatingArchive.query.one().id_dish == catalog['borsch']
+    orders = partition(OrderOfDishes)
+    assert db.session.execute(select(func.count()).select_from(orders)).scalar() == 3
+    # Агрегаты учитывают и архив: пересчёт даёт то же, что было до переноса
+    rebuild_rating_stats()
+    assert _stats(catalog['borsch']) == (1, 2)
+
+
+def test_archived_ids_are_not_reused(catalog):
+    _seed(catalog)
+    archive_before(CUTOFF)
+    newest = db.session.query(func.max(OrderOfDishes.id_order)).scalar()
+    OrderOfDishes.query.filter_by(id_order=newest).delete()
+    db.session.commit()
+
+    order = OrderOfDishes(id_dish=catalog['salad'], id_user=catalog['user'], date=NEW)
+    db.session.add(order)
+    db.session.commit()
+
+    archived = {ident for ident, in db.session.query(OrderOfDishesArchive.id_order)}
+    assert order.id_order > newest
+    assert order.id_order not in archived
+
+
+def test_delete_archived_rating_adjusts_stats(catalog):
+    _seed(catalog)
+    archive_before(CUTOFF)
+    id_rate = DishRatingArchive.query.one().id_rate
+
+    result = delete_with_policies(DishRating, id_rate)
+
+    assert result['success']
+    assert DishRatingArchive.query.count() == 0
+    assert _stats(catalog['borsch']) == (0, 0)
+    assert _stats(catalog['salad']) == (1, 5)
+    assert delete_with_policies(DishRating, id_rate)['not_found']
+
+
+def test_batch_delete_by_filter_reaches_archive(catalog):
+    _seed(catalog)
+    archive_before(CUTOFF)
+
+    dry = batch_delete('orders', filters={'id_dish': catalog['borsch']}, dry_run=True)
+    assert (dry['matched'], dry['deleted']) == (2, 2)
+
+    result = batch_delete('orders', filters={'date': {'lt': '2024-01-01'}})
+    assert result['success']
+    assert result['deleted'] == 2
+    assert OrderOfDishesArchive.query.count() == 0
+    assert OrderOfDishes.query.count() == 1
+
+
+def test_dish_delete_nullifies_archived_orders(catalog):
+    _seed(catalog)
+    archive_before(CUTOFF)
+
+    assert delete_with_policies(Dish, catalog['borsch'])['success']
+
+    assert {order.id_dish for order in OrderOfDishesArchive.query} == {None}
+    assert DishRatingArchive.query.count() == 0
+
+
+def test_migration_rebuilds_tables_with_autoincrement(catalog):
+    _seed(catalog)
+    archive_before(CUTOFF)
+    hot = OrderOfDishes.__table__
+    columns = ', '.join(column.name for column in hot.c)
+    # Таблица в том виде, в каком её создавали старые версии: без AUTOINCREMENT и без sqlite_sequence
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(f'ALTER TABLE {hot.name} RENAME TO legacy')
+        connection.exec_driver_sql(
+            f'CREATE TABLE {hot.name} (id_order INTEGER NOT NULL PRIMARY KEY, id_dish INTEGER, '
+            f'id_user INTEGER, date DATE)'
+        )
+        connection.exec_driver_sql(f'INSERT INTO {hot.name} ({columns}) SELECT {columns} FROM legacy')
+        connection.exec_driver_sql('DROP TABLE legacy')
+        connection.exec_driver_sql(f"DELETE FROM sqlite_sequence WHERE name = '{hot.name}'")
+    db.session.remove()
+
+    assert f'{hot.name}: таблица пересоздана с AUTOINCREMENT' in migrate_schema()
+    assert migrate_schema() == []
+
+    with db.engine.connect() as connection:
+        sql = connection.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (hot.name,)
+        ).scalar()
+        seq = connection.exec_driver_sql('SELECT seq FROM sqlite_sequence WHERE name = ?', (hot.name,)).scalar()
+    archived_max = db.session.query(func.max(OrderOfDishesArchive.id_order)).scalar()
+    assert 'AUTOINCREMENT' in sql
+    assert seq >= archived_max
+    assert OrderOfDishes.query.one().date == NEW
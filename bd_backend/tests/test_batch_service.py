@@ -0,0 +1,89 @@
+from datetime import date
+
+from models import db, DishRating, DishRatingStats, OrderOfDishes
+from services.batch_service import batch_delete, batch_update
+from services.rating_service import rebuild_rating_stats
+
+
+def _rate(catalog, rate, id_dish=None, id_user=None):
+    rating = DishRating(
+        id_user=id_user or catalog['user'], id_dish=id_dish or catalog['borsch'], rate=rate, date=date(2024, 1, 1)
+    )
+    db.session.add(rating)
+    db.session.flush()
+    return rating.id_rate
+
+
+def test_update_rejects_values_of_wrong_type(catalog):
+    id_rate = _rate(catalog, 3)
+    db.session.commit()
+
+    for values in ({'rate': '5'}, {'rate': True}, {'rate': 4.5}, {'date': 'not a date'}):
+        result = batch_update('ratings', values, ids=[id_rate])
+        assert not result['success'], values
+        assert result['invalid'], values
+    assert db.session.get(DishRating, id_rate).rate == 3
+
+
+def test_update_rejects_bad_requests(catalog):
+    id_rate = _rate(catalog, 3)
+    db.session.commit()
+
+    assert batch_update('ratings', {'rate': 6}, ids=[id_rate])['invalid']
+    assert batch_update('ratings', {'id_rate': 7}, ids=[id_rate])['invalid']
+    assert batch_update('ratings', {'password': 'x'}, ids=[id_rate])['invalid']
+    assert batch_update('ratings', {'rate': 4}, ids='1,2')['invalid']
+    assert batch_update('ratings', {'rate': 4}, filters={'rate': {'like': 3}})['invalid']
+    assert batch_update('ratings', {'rate': 4})['invalid']
+
+
+def test_update_by_filter_refreshes_rating_stats(catalog):
+    _rate(catalog, 2)
+    _rate(catalog, 5, id_dish=catalog['salad'])
+    rebuild_rating_stats()
+    db.session.commit()
+
+    result = batch_update('ratings', {'rate': 4}, filters={'rate': {'lt': 3}})
+
+    assert result == {'success': True, 'matched': 1, 'updated': 1}
+    stats = db.session.get(DishRatingStats, catalog['borsch'])
+    assert (stats.rating_count, stats.rating_sum) == (1, 4)
+    assert db.session.get(DishRatingStats, catalog['salad']).rating_sum == 5
+
+
+def test_update_by_date_filter(catalog):
+    db.session.add_all([
+        OrderOfDishes(id_dish=catalog['borsch'], id_user=catalog['user'], date=date(2024, 1, 1)),
+        OrderOfDishes(id_dish=catalog['borsch'], id_user=catalog['user'], date=date(2024, 3, 1)),
+    ])
+    db.session.commit()
+
+    result = batch_update('orders', {'id_dish': catalog['salad']}, filters={'date': {'gte': '2024-02-01'}})
+
+    assert result['updated'] == 1
+    assert sorted(order.id_dish for order in OrderOfDishes.query) == [catalog['borsch'], catalog['salad']]
+
+
+def test_delete_dry_run_and_filter(catalog):
+    _rate(catalog, 1)
+    _rate(catalog, 5, id_dish=catalog['salad'])
+    rebuild_rating_stats()
+    db.session.commit()
+
+    dry = batch_delete('ratings', filters={'rate': {'lte': 2}}, dry_run=True)
+    assert (dry['matched'], dry['deleted']) == (1, 1)
+    assert DishRating.query.count() == 2
+
+    result = batch_delete('ratings', filters={'rate': {'lte': 2}})
+    assert result['success']
+    assert DishRating.query.count() == 1
+    stats = db.session.get(DishRatingStats, catalog['borsch'])
+    assert (stats.rating_count, stats.rating_sum) == (0, 0)
+
+
+def test_delete_restricted_product_is_reported(catalog):
+    result = batch_delete('products', ids=[catalog['product'], catalog['spare']])
+
+    assert not result['success']
+    assert result['restricted']
+    assert result['matched'] == 2
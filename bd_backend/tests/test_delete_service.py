@@ -0,0 +1,83 @@
+from datetime import date
+
+from models import db, Chief, Country, Dish, DishRating, DishRatingStats, Human, OrderOfDishes, Product, Recipe
+from services.delete_service import delete_many_with_policies, delete_with_policies
+from services.rating_service import rebuild_rating_stats
+
+
+def _affected(result):
+    return {(item['table'], item['column']): item['rows'] for item in result['affected']}
+
+
+def test_restrict_blocks_delete_and_keeps_rows(catalog):
+    result = delete_with_policies(Product, catalog['product'])
+
+    assert not result['success']
+    assert result['restricted']
+    assert _affected(result)[('recipe', 'id_product')] == 1
+    assert db.session.get(Product, catalog['product']) is not None
+    assert Recipe.query.count() == 1
+
+
+def test_restrict_does_not_block_unused_product(catalog):
+    result = delete_with_policies(Product, catalog['spare'])
+
+    assert result['success']
+    assert result['deleted'] == 1
+    assert db.session.get(Product, catalog['spare']) is None
+
+
+def test_cascade_and_nullify_on_dish_delete(catalog):
+    db.session.add_all([
+        DishRating(id_user=catalog['user'], id_dish=catalog['borsch'], rate=4, date=date(2024, 1, 1)),
+        OrderOfDishes(id_dish=catalog['borsch'], id_user=catalog['user'], date=date(2024, 1, 1)),
+    ])
+    rebuild_rating_stats()
+    db.session.commit()
+
+    result = delete_with_policies(Dish, catalog['borsch'])
+
+    assert result['success']
+    affected = _affected(result)
+    assert affected[('recipe', 'id_dish')] == 1
+    assert affected[('dish_rating', 'id_dish')] == 1
+    assert affected[('order_of_dishes', 'id_dish')] == 1
+    assert Recipe.query.count() == 0
+    assert DishRating.query.count() == 0
+    assert DishRatingStats.query.count() == 0
+    # Заказы остаются для выручки, ссылка на блюдо обнуляется
+    order = OrderOfDishes.query.one()
+    assert order.id_dish is None
+
+
+def test_nullify_on_country_delete(catalog):
+    result = delete_with_policies(Country, catalog['country'])
+
+    assert result['success']
+    assert _affected(result) == {('chief', 'id_country'): 1, ('dish', 'id_country'): 2, ('human', 'id_country'): 1}
+    assert db.session.get(Chief, catalog['chief']).id_country is None
+    assert db.session.get(Human, catalog['user']).id_country is None
+    assert {dish.id_country for dish in Dish.query} == {None}
+
+
+def test_dry_run_counts_without_changes(catalog):
+    db.session.add(OrderOfDishes(id_dish=catalog['salad'], id_user=catalog['user'], date=date(2024, 1, 1)))
+    db.session.commit()
+
+    result = delete_many_with_policies(Dish, [catalog['borsch'], catalog['salad'], 999], dry_run=True)
+
+    assert result['success']
+    assert result['dry_run']
+    assert result['deleted'] == 2
+    affected = _affected(result)
+    assert affected[('recipe', 'id_dish')] == 1
+    assert affected[('order_of_dishes', 'id_dish')] == 1
+    assert Dish.query.count() == 2
+    assert Recipe.query.count() == 1
+    assert OrderOfDishes.query.one().id_dish == catalog['salad']
+
+
+def test_missing_record_is_not_found(catalog):
+    result = delete_with_policies(Dish, 999)
+
+    assert result['not_found']